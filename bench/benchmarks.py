@@ -0,0 +1,350 @@
+"""Benchmarks for the PKS loaders and the hot paths of DataFunctions.
+
+Every benchmark is timed several times, the results (min/median/mean in seconds) are stored as JSON named after
+the current commit, so runs of different commits can be compared.
+
+Usage (from the repository root):
+    python bench/benchmarks.py                      # all benchmarks, results in bench/results/<commit>.json
+    python bench/benchmarks.py --quick              # skip the slow benchmarks that parse Excel files
+    python bench/benchmarks.py --filter monthly     # only benchmarks whose name contains 'monthly'
+    python bench/benchmarks.py --compare bench/results/<old>.json bench/results/<new>.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+import warnings
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+import pandas as pd
+from src.DataLoaders import T01DataLoader, T08DataLoader, T20DataLoader, LKS01, read_table
+from src.DataCache import frame_cache
+from src.DataFunctions import (transform_df_to_list, get_monthly_cases, transform_monthly_data_to_list,
+                               get_monthly_cases_by_keys, get_yearly_cases_by_key, get_yearly_cases_by_keys)
+
+ROOT_DIR = os.path.join(REPO_ROOT, 'dat', 'PKS')
+RESULTS_DIR = os.path.join(REPO_ROOT, 'bench', 'results')
+LOADERS = {'T01': (T01DataLoader, range(2012, 2023)),
+           'T08': (T08DataLoader, range(2012, 2023)),
+           'T20': (T20DataLoader, range(2012, 2023)),
+           'LKS01': (LKS01, range(2013, 2023))}
+
+BENCHMARKS = []
+
+def benchmark(name:str, repeat:int=5, slow:bool=False):
+    """Registers a benchmark. The decorated function is called once as setup and returns the function to time.
+    """
+    def register(setup):
+        BENCHMARKS.append({'name': name, 'setup': setup, 'repeat': repeat, 'slow': slow})
+        return setup
+    return register
+
+
+def scale_table(df:pd.DataFrame, factor:int) -> pd.DataFrame:
+    """Creates a synthetic table with factor times the rows of df, the keys of the copies get a suffix
+
+    Args:
+        df (pd.DataFrame): Crime table
+        factor (int): Number of copies
+
+    Returns:
+        table (pd.DataFrame): Scaled-up table
+    """
+    copies = []
+    for i in range(factor):
+        copy = df.copy()
+        if i > 0:
+            copy['Schlüssel'] = copy['Schlüssel'].astype(str) + f'_{i}'
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+# Loading
+def _register_loader_benchmarks():
+    for table, (loader_cls, years) in LOADERS.items():
+        year = years[-1]
+
+        @benchmark(f'load_{table}_{year}_parse', repeat=1, slow=True)
+        def _parse(loader_cls=loader_cls, year=year):
+            loader = loader_cls(ROOT_DIR, use_cache=False)
+            return lambda: loader[year]
+
+        for backend in ['default', 'calamine']:
+            @benchmark(f'read_table_{table}_{year}_{backend}', repeat=1, slow=True)
+            def _read(loader_cls=loader_cls, year=year, backend=backend):
+                fpath, schema = loader_cls(ROOT_DIR).get_file(year)
+                return lambda: read_table(fpath, schema, backend=backend)
+
+        @benchmark(f'load_{table}_{year}_disk_cache')
+        def _disk(loader_cls=loader_cls, year=year):
+            loader = loader_cls(ROOT_DIR)
+            loader[year] # make sure the disk cache exists
+            def run():
+                frame_cache.clear()
+                return loader[year]
+            return run
+
+        @benchmark(f'load_{table}_{year}_memory_cache', repeat=20)
+        def _memory(loader_cls=loader_cls, year=year):
+            loader = loader_cls(ROOT_DIR)
+            loader[year]
+            return lambda: loader[year]
+
+        @benchmark(f'load_{table}_all_years_parse', repeat=1, slow=True)
+        def _parse_all(loader_cls=loader_cls, years=years):
+            loader = loader_cls(ROOT_DIR, use_cache=False)
+            return lambda: [loader[y] for y in years]
+
+        @benchmark(f'load_{table}_all_years_disk_cache')
+        def _disk_all(loader_cls=loader_cls, years=years):
+            loader = loader_cls(ROOT_DIR)
+            loader.load_many(years, workers=1)
+            def run():
+                frame_cache.clear()
+                return [loader[y] for y in years]
+            return run
+
+_register_loader_benchmarks()
+
+
+# DataFunctions
+def _t08_data(scale:int=1):
+    data = transform_df_to_list(T08DataLoader(ROOT_DIR), range(2012, 2023))
+    if scale > 1:
+        data = [(year, scale_table(df, scale)) for year, df in data]
+    return data
+
+@benchmark('get_monthly_cases_single_key')
+def _monthly_single():
+    df = T08DataLoader(ROOT_DIR)[2022]
+    return lambda: get_monthly_cases(df, '------', True)
+
+@benchmark('transform_monthly_data_to_list_single_key')
+def _monthly_list():
+    data = _t08_data()
+    return lambda: transform_monthly_data_to_list(data, '517500', True)
+
+@benchmark('transform_monthly_data_to_list_100_keys')
+def _monthly_list_many():
+    data = _t08_data()
+    keys = list(data[-1][1]['Schlüssel'].unique()[:100])
+    return lambda: [transform_monthly_data_to_list(data, key, True) for key in keys]
+
+@benchmark('get_monthly_cases_by_keys_all_keys')
+def _monthly_batch():
+    data = _t08_data()
+    keys = list(data[-1][1]['Schlüssel'].unique())
+    return lambda: get_monthly_cases_by_keys(data, keys, True)
+
+@benchmark('get_monthly_cases_by_keys_all_keys_scaled_x20', repeat=3)
+def _monthly_batch_scaled():
+    data = _t08_data(scale=20)
+    keys = list(data[-1][1]['Schlüssel'].unique())
+    return lambda: get_monthly_cases_by_keys(data, keys, True)
+
+def _t01_data():
+    return transform_df_to_list(T01DataLoader(ROOT_DIR), range(2012, 2023))
+
+@benchmark('get_yearly_cases_by_key_single_key')
+def _yearly_single():
+    data = _t01_data()
+    return lambda: get_yearly_cases_by_key('510000', data, True)
+
+@benchmark('get_yearly_cases_by_keys_all_keys_3_columns')
+def _yearly_batch():
+    data = _t01_data()
+    keys = list(data[-1][1]['Schlüssel'].unique())
+    columns = ['Anzahl erfasste Fälle', 'Aufklärung: Anzahl Fälle', 'Tatverdächtige: insgesamt']
+    return lambda: get_yearly_cases_by_keys(keys, data, columns)
+
+@benchmark('reconcile_all_tables')
+def _reconcile():
+    from src.Reconciliation import reconcile
+    reconcile(ROOT_DIR) # make sure the disk cache exists
+    return lambda: reconcile(ROOT_DIR)
+
+@benchmark('data_cube_open_select_lks01_cases_all_keys', repeat=10)
+def _data_cube_select():
+    from src.DataCube import update_cube, DataCube
+    cube_dir = update_cube(ROOT_DIR, workers=1).cube_dir
+    def run():
+        return DataCube(cube_dir).select('LKS01', metrics='Anzahl erfasste Fälle')
+    return run
+
+@benchmark('panel_slice_lks01_cases_all_keys', repeat=10)
+def _panel_slice():
+    from src.DataPanel import update_panel, get_panel_slice
+    panel, _, _ = update_panel(ROOT_DIR, workers=1)
+    return lambda: get_panel_slice(panel, metric='Anzahl erfasste Fälle', table='LKS01')
+
+@benchmark('compute_rates_all_keys_states')
+def _compute_rates():
+    from src.Rates import compute_rates, load_population
+    population = load_population(os.path.join(REPO_ROOT, 'dat', 'Destatis', '02-bundeslaender.xlsx'))
+    compute_rates(ROOT_DIR, population=population) # make sure the disk cache exists
+    return lambda: compute_rates(ROOT_DIR, population=population)
+
+@benchmark('offender_tensor_build')
+def _offender_tensor_build():
+    from src.OffenderTensor import OffenderTensor
+    loader = T20DataLoader(ROOT_DIR)
+    loader.load_many(range(2012, 2023), workers=1)
+    return lambda: OffenderTensor.from_loader(loader, range(2012, 2023))
+
+@benchmark('offender_tensor_select_all_keys_composite_bands', repeat=20)
+def _offender_tensor_select():
+    from src.OffenderTensor import OffenderTensor
+    tensor = OffenderTensor.from_loader(T20DataLoader(ROOT_DIR), range(2012, 2023))
+    return lambda: tensor.select(sex='X', bands=['Anzahl erfasste TV', '0-13', '14-17', '18-20', '21-24', '>21'])
+
+@benchmark('correlation_matrix_all_keys_monthly')
+def _correlation_matrix():
+    from src.Correlation import key_time_matrix, correlation_matrix
+    keys, matrix = key_time_matrix(_t08_data())
+    return lambda: correlation_matrix(matrix)
+
+@benchmark('top_correlated_pairs_all_keys_monthly_scaled_x20', repeat=3)
+def _correlation_top_k():
+    from src.Correlation import key_time_matrix, top_correlated_pairs
+    keys, matrix = key_time_matrix(_t08_data(scale=20))
+    return lambda: top_correlated_pairs(matrix, keys, k=100)
+
+@benchmark('add_geomery_federal_states', repeat=10)
+def _add_geometry():
+    import geopandas as gpd
+    from shapely.geometry import box
+    from src.DataFunctions import add_geomery, get_key_col
+    df = get_key_col(LKS01(ROOT_DIR)[2022], '897000')
+    # synthetic geometry: one box per federal state (the shapefiles are not part of the repository)
+    states = df['Bundesland'].unique()
+    geo = gpd.GeoDataFrame({'Bundesland': states,
+                            'geometry': [box(i, 0, i + 1, 1) for i in range(len(states))]}, geometry='geometry')
+    return lambda: add_geomery(df, geo)
+
+
+# Import time (interpreter startup included, as for a batch job)
+HEAVY_MODULES = ['geopandas', 'shapely', 'pyproj', 'matplotlib']
+
+def _import_benchmark(statement:str, forbidden:list):
+    """Returns a function running the import statement in a fresh interpreter.
+       Raises an AssertionError if one of the forbidden modules gets imported.
+    """
+    code = (f'import sys\n{statement}\n'
+            f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))')
+    def run():
+        return subprocess.check_output([sys.executable, '-c', code], cwd=REPO_ROOT, text=True).strip()
+    loaded = [module for module in run().split(',') if module]
+    unexpected = [module for module in loaded if module in forbidden]
+    if unexpected:
+        raise AssertionError(f'{statement!r} imports {unexpected}, which should only be loaded lazily')
+    return run
+
+@benchmark('import_python_pandas_baseline', repeat=5)
+def _import_pandas():
+    return _import_benchmark('import numpy, pandas', [])
+
+@benchmark('import_src_non_spatial', repeat=5)
+def _import_non_spatial():
+    return _import_benchmark('import src.DataLoaders, src.DataFunctions, src.DataPanel, src.PlotFunctions, '
+                             'src.CsvStream, src.PlzLookup, src.KeyHierarchy', HEAVY_MODULES)
+
+@benchmark('import_src_package_attributes', repeat=5)
+def _import_package():
+    return _import_benchmark('from src import LKS01, transform_monthly_data_to_list, build_panel', HEAVY_MODULES)
+
+@benchmark('import_src_spatial', repeat=5)
+def _import_spatial():
+    return _import_benchmark('import src.GeoFunctions', ['matplotlib'])
+
+
+def run_benchmarks(name_filter:str=None, quick:bool=False) -> dict:
+    """Runs the registered benchmarks
+
+    Args:
+        name_filter (str): Only run benchmarks whose name contains this string (default: None)
+        quick (bool): Whether the slow benchmarks that parse Excel files are skipped (default: False)
+
+    Returns:
+        results (dict): Timings in seconds keyed by benchmark name
+    """
+    results = dict()
+    for bench in BENCHMARKS:
+        if (name_filter and name_filter not in bench['name']) or (quick and bench['slow']):
+            continue
+        try:
+            fn = bench['setup']()
+        except ImportError as e:
+            print(f"{bench['name']:55s} skipped ({e})")
+            continue
+        timings = []
+        for _ in range(bench['repeat']):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        results[bench['name']] = {'min': min(timings),
+                                  'median': statistics.median(timings),
+                                  'mean': statistics.mean(timings),
+                                  'repeat': bench['repeat']}
+        print(f"{bench['name']:55s} {results[bench['name']]['median'] * 1e3:12.3f} ms")
+    return results
+
+
+def get_metadata() -> dict:
+    """Returns the commit and environment of the benchmark run
+    """
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    return {'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count()}
+
+
+def compare(old_path:str, new_path:str):
+    """Prints the median timings of two result files and their ratio
+    """
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{'benchmark':55s} {old['metadata']['commit']:>12s} {new['metadata']['commit']:>12s}    ratio")
+    for name in sorted(set(old['results']) | set(new['results'])):
+        t_old = old['results'].get(name, {}).get('median')
+        t_new = new['results'].get(name, {}).get('median')
+        ratio = f'{t_new / t_old:8.2f}' if t_old and t_new else '       -'
+        fmt = lambda t: f'{t * 1e3:9.3f} ms' if t is not None else '          -'
+        print(f'{name:55s} {fmt(t_old)} {fmt(t_new)} {ratio}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for the PKS loaders and DataFunctions')
+    parser.add_argument('--filter', default=None, help='only run benchmarks whose name contains this string')
+    parser.add_argument('--quick', action='store_true', help='skip the benchmarks that parse Excel files')
+    parser.add_argument('--output', default=None, help='result file (default: bench/results/<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit(0)
+
+    warnings.simplefilter('ignore') # openpyxl style warnings
+    metadata = get_metadata()
+    results = run_benchmarks(args.filter, args.quick)
+    output = args.output or os.path.join(RESULTS_DIR, f"{metadata['commit']}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({'metadata': metadata, 'results': results}, f, indent=2)
+    print(f'Results written to {output}')
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+from .DataFunctions import get_monthly_cases_by_keys, get_yearly_cases_by_keys
+from .Instrumentation import instrument
+
+CORRELATION_METHODS = ['pearson', 'spearman']
+# Rows of the key x time matrix correlated at once, the temporary block has block_size x block_size values
+DEFAULT_BLOCK_SIZE = 1024
+
+
+@instrument('Correlation.key_time_matrix')
+def key_time_matrix(data:list[tuple[int, pd.DataFrame]], keys:list=None, granularity:str='monthly',
+                    column:str='Anzahl erfasste Fälle') -> tuple:
+    """Builds the matrix of all crime keys over time, one row per key.
+       Keys missing in a year count as 0 cases (like transform_monthly_data_to_list and get_yearly_cases_by_key).
+
+    Args:
+        data (list[tuple[int, pd.DataFrame]]): Generated by transform_df_to_list, T08 tables for monthly granularity
+        keys (list): Crime keys (default: None, all keys of the tables)
+        granularity (str): 'monthly' (12 values per year of the T08 tables) or 'yearly' (default: 'monthly')
+        column (str): Column of the yearly values, only used for yearly granularity (default: 'Anzahl erfasste Fälle')
+
+    Raises:
+        ValueError: If granularity is neither 'monthly' nor 'yearly'
+
+    Returns:
+        keys (list): Crime keys of the rows
+        matrix (np.ndarray): Cases of shape (len(keys), number of months or years)
+    """
+    if granularity not in ['monthly', 'yearly']:
+        raise ValueError(f"Unknown granularity: {granularity}. Use 'monthly' or 'yearly'")
+    if keys is None:
+        keys = pd.unique(np.concatenate([df['Schlüssel'].astype(str).to_numpy() for _, df in data]))
+    keys = list(keys)
+    if granularity == 'monthly':
+        _, cases = get_monthly_cases_by_keys(data, keys, True)
+        return keys, cases.reshape(len(keys), -1).astype(float)
+    _, cases = get_yearly_cases_by_keys(keys, data, [column])
+    return keys, np.nan_to_num(cases[:, :, 0])
+
+
+def _standardize(matrix:np.ndarray, method:str) -> np.ndarray:
+    """Centers every row and scales it to unit norm (after ranking for Spearman), so that the correlation of two rows
+       is their dot product. Constant rows become NaN.
+    """
+    if method not in CORRELATION_METHODS:
+        raise ValueError(f'Unknown correlation method: {method}. Use one of {CORRELATION_METHODS}')
+    matrix = np.asarray(matrix, dtype=float)
+    if method == 'spearman':
+        # average ranks of ties, as scipy.stats.spearmanr
+        matrix = pd.DataFrame(matrix).rank(axis=1).to_numpy()
+    centered = matrix - matrix.mean(axis=1, keepdims=True)
+    norm = np.sqrt(np.einsum('ij,ij->i', centered, centered))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return centered / np.where(norm > 0, norm, np.nan)[:, None]
+
+
+@instrument('Correlation.correlation_matrix')
+def correlation_matrix(matrix:np.ndarray, method:str='pearson', block_size:int=DEFAULT_BLOCK_SIZE,
+                       out:np.ndarray=None) -> np.ndarray:
+    """Computes the correlations of all rows with each other, block by block.
+       Apart from the result only one block of block_size x block_size values is allocated at once, the result can
+       be a np.memmap for very many keys.
+
+    Args:
+        matrix (np.ndarray): Values of shape (keys, time), e.g. created by key_time_matrix
+        method (str): 'pearson' or 'spearman' (default: 'pearson')
+        block_size (int): Number of rows correlated at once (default: DEFAULT_BLOCK_SIZE)
+        out (np.ndarray): Array of shape (keys, keys) the result is written to (default: None, a new array)
+
+    Raises:
+        ValueError: If the method is unknown
+
+    Returns:
+        correlations (np.ndarray): Correlations of shape (keys, keys), NaN for constant rows
+    """
+    z = _standardize(matrix, method)
+    n = z.shape[0]
+    if out is None:
+        out = np.empty((n, n))
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        for col_start in range(start, n, block_size):
+            col_stop = min(col_start + block_size, n)
+            block = np.clip(z[start:stop] @ z[col_start:col_stop].T, -1, 1)
+            out[start:stop, col_start:col_stop] = block
+            if col_start != start:
+                out[col_start:col_stop, start:stop] = block.T
+    return out
+
+
+@instrument('Correlation.top_correlated_pairs')
+def top_correlated_pairs(matrix:np.ndarray, keys:list, k:int=100, method:str='pearson', absolute:bool=True,
+                         block_size:int=DEFAULT_BLOCK_SIZE) -> pd.DataFrame:
+    """Returns the k most correlated pairs of different keys without materializing the full correlation matrix.
+       The upper triangle is computed block by block, only the best k candidates are kept between blocks.
+
+    Args:
+        matrix (np.ndarray): Values of shape (keys, time), e.g. created by key_time_matrix
+        keys (list): Crime keys of the rows
+        k (int): Number of pairs (default: 100)
+        method (str): 'pearson' or 'spearman' (default: 'pearson')
+        absolute (bool): Whether pairs are ranked by the absolute correlation, otherwise strongly negative
+                         correlations are ranked last (default: True)
+        block_size (int): Number of rows correlated at once (default: DEFAULT_BLOCK_SIZE)
+
+    Raises:
+        ValueError: If the method is unknown
+
+    Returns:
+        pairs (pd.DataFrame): Columns key1, key2 and correlation, sorted by descending (absolute) correlation.
+        Pairs with a constant row are left out.
+    """
+    z = _standardize(matrix, method)
+    n = z.shape[0]
+    rows = np.empty(0, dtype=np.int64)
+    cols = np.empty(0, dtype=np.int64)
+    values = np.empty(0)
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        for col_start in range(start, n, block_size):
+            col_stop = min(col_start + block_size, n)
+            block = np.clip(z[start:stop] @ z[col_start:col_stop].T, -1, 1)
+            score = np.abs(block) if absolute else block.copy()
+            score[~np.isfinite(score)] = -np.inf
+            if col_start == start:
+                # only pairs with row < col
+                score[np.tril_indices(stop - start, 0, col_stop - col_start)] = -np.inf
+            # best k candidates of the block, merged with the best k so far
+            flat = score.ravel()
+            best = np.argpartition(-flat, k - 1)[:k] if len(flat) > k else np.arange(len(flat))
+            best = best[flat[best] > -np.inf]
+            block_rows, block_cols = np.divmod(best, col_stop - col_start)
+            rows = np.concatenate([rows, block_rows + start])
+            cols = np.concatenate([cols, block_cols + col_start])
+            values = np.concatenate([values, block[block_rows, block_cols]])
+            if len(values) > k:
+                score = np.abs(values) if absolute else values
+                best = np.argpartition(-score, k - 1)[:k]
+                rows, cols, values = rows[best], cols[best], values[best]
+
+    score = np.abs(values) if absolute else values
+    order = np.argsort(-score, kind='stable')
+    keys = np.asarray(keys, dtype=object)
+    return pd.DataFrame({'key1': keys[rows[order]], 'key2': keys[cols[order]], 'correlation': values[order]})
@@ -0,0 +1,131 @@
+import pandas as pd
+
+# Format of the PKS CSV releases (e.g. dat/PKS/2022/T01-Faelle.csv): the first row only numbers the columns
+PKS_CSV_OPTIONS = {'sep': ';',
+                   'encoding': 'iso8859-1',
+                   'skiprows': 1,
+                   'thousands': ',',
+                   'decimal': '.'}
+KEY_COLUMN = 'Schluessel'
+YEAR_COLUMN = 'Jahr'
+# Aggregations that can be combined chunk by chunk
+AGGREGATIONS = ['sum', 'count', 'min', 'max', 'mean']
+
+
+def iter_pks_csv(fpath:str, keys:list=None, years=None, columns:list=None, chunksize:int=100000, **options):
+    """Reads a PKS CSV file in chunks and yields the rows matching the filters, so only one chunk is held in memory
+
+    Args:
+        fpath (str): Path of the CSV file
+        keys (list): Only rows with these crime keys (default: None, all keys)
+        years: Only rows of these years, e.g. range(2012, 2023) (default: None, all years)
+        columns (list): Columns to return besides the key and year, the other columns are not parsed (default: None, all)
+        chunksize (int): Number of rows parsed at once (default: 100,000)
+        **options: Further arguments of pd.read_csv, overriding PKS_CSV_OPTIONS
+
+    Yields:
+        chunk (pd.DataFrame): Filtered rows of one chunk (chunks without matching rows are skipped)
+    """
+    options = {**PKS_CSV_OPTIONS, **options}
+    usecols = None
+    if columns is not None:
+        wanted = set([KEY_COLUMN, YEAR_COLUMN] + list(columns))
+        usecols = lambda col: col in wanted
+    keys = None if keys is None else set(str(key) for key in keys)
+    years = None if years is None else set(int(year) for year in years)
+
+    reader = pd.read_csv(fpath, chunksize=chunksize, usecols=usecols, dtype={KEY_COLUMN: str}, **options)
+    with reader:
+        for chunk in reader:
+            # lines end with ';', which adds an empty unnamed column
+            chunk = chunk.loc[:, ~chunk.columns.str.startswith('Unnamed')]
+            mask = None
+            if keys is not None:
+                mask = chunk[KEY_COLUMN].isin(keys)
+            if years is not None:
+                year_mask = chunk[YEAR_COLUMN].isin(years)
+                mask = year_mask if mask is None else mask & year_mask
+            if mask is not None:
+                chunk = chunk.loc[mask]
+            if len(chunk) > 0:
+                yield chunk
+
+
+def read_pks_csv(fpath:str, keys:list=None, years=None, columns:list=None, chunksize:int=100000, **options) -> pd.DataFrame:
+    """Reads the rows of a PKS CSV file matching the filters, see iter_pks_csv
+
+    Returns:
+        table (pd.DataFrame): Matching rows of the file
+    """
+    chunks = list(iter_pks_csv(fpath, keys, years, columns, chunksize, **options))
+    if len(chunks) == 0:
+        empty = pd.read_csv(fpath, nrows=0, **{**PKS_CSV_OPTIONS, **options})
+        return empty.loc[:, ~empty.columns.str.startswith('Unnamed')]
+    return pd.concat(chunks, ignore_index=True)
+
+
+def aggregate_pks_csv(fpath:str, columns:list, by:list=None, how:str='sum', keys:list=None,
+                      years=None, chunksize:int=100000, **options) -> pd.DataFrame:
+    """Aggregates columns of a PKS CSV file per group while streaming it. The partial results of each chunk are merged
+       into the running result, so the memory only depends on the chunk size and the number of groups.
+
+    Args:
+        fpath (str): Path of the CSV file
+        columns (list): Numeric columns to aggregate, e.g. ['erfasste Faelle']
+        by (list): Columns to group by (default: None, ['Schluessel', 'Jahr'])
+        how (str): One of AGGREGATIONS (default: 'sum')
+        keys (list): Only rows with these crime keys (default: None, all keys)
+        years: Only rows of these years (default: None, all years)
+        chunksize (int): Number of rows parsed at once (default: 100,000)
+        **options: Further arguments of pd.read_csv, overriding PKS_CSV_OPTIONS
+
+    Raises:
+        ValueError: If how is not one of AGGREGATIONS
+
+    Returns:
+        aggregates (pd.DataFrame): Aggregated columns indexed by the groups
+    """
+    if how not in AGGREGATIONS:
+        raise ValueError(f'Unknown aggregation: {how}. Use one of {AGGREGATIONS}')
+    columns = list(columns)
+    by = [KEY_COLUMN, YEAR_COLUMN] if by is None else list(by)
+    partial_how = ['sum', 'count'] if how == 'mean' else [how]
+    # partial results of two chunks combine with: sum -> sum, count -> sum, min -> min, max -> max
+    combine = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max'}
+
+    thousands = {**PKS_CSV_OPTIONS, **options}['thousands']
+    result = None
+    for chunk in iter_pks_csv(fpath, keys, years, list(dict.fromkeys(columns + by)), chunksize, **options):
+        for col in columns:
+            if chunk[col].dtype == object:
+                # the C parser does not apply the thousands separator to floats (e.g. HZ '7,268.70')
+                chunk[col] = pd.to_numeric(chunk[col].str.replace(thousands, '', regex=False), errors='coerce')
+        grouped = chunk.groupby(by, observed=True)[columns]
+        partial = pd.concat({agg: getattr(grouped, agg)() for agg in partial_how}, axis=1)
+        if result is None:
+            result = partial
+        else:
+            result = pd.concat([result, partial]).groupby(level=list(range(len(by))), observed=True).agg(
+                {col: combine[col[0]] for col in partial.columns})
+    if result is None:
+        return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_tuples([], names=by) if len(by) > 1 else None)
+
+    result = result.sort_index()
+    if how == 'mean':
+        return result['sum'] / result['count']
+    return result[how]
+
+
+def get_csv_time_series(fpath:str, key:str, column:str='erfasste Faelle', chunksize:int=100000) -> pd.Series:
+    """Returns the values of one crime key per year from a PKS CSV file (e.g. the cases of all years since 1987)
+
+    Args:
+        fpath (str): Path of the CSV file
+        key (str): Crime key
+        column (str): Column of interest (default: 'erfasste Faelle')
+        chunksize (int): Number of rows parsed at once (default: 100,000)
+
+    Returns:
+        time series (pd.Series): Values indexed by year
+    """
+    return aggregate_pks_csv(fpath, [column], by=[YEAR_COLUMN], keys=[key], chunksize=chunksize)[column]
@@ -0,0 +1,247 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+
+def get_default_cache_dir(root_dir:str) -> str:
+    """Returns the default cache directory for a given data root directory.
+       The cache lives next to the data root (e.g. '../dat/PKS/' -> '../dat/cache/') so that it is not
+       counted as a year directory by the loaders.
+
+    Args:
+        root_dir (str): The root directory containing the yearly directories of tables
+
+    Returns:
+        cache directory (str): Path of the cache directory
+    """
+    return os.path.join(os.path.dirname(os.path.normpath(root_dir)), 'cache')
+
+
+def file_fingerprint(fpath:str, version) -> str:
+    """Computes a fingerprint of a source file from its absolute path, size, modification time and the loader version.
+       Any change of the file or of the loading code (via the version) results in a new fingerprint.
+
+    Args:
+        fpath (str): Path of the source file
+        version: Version of the code that normalizes the file
+
+    Returns:
+        fingerprint (str): Hex digest identifying the file state
+    """
+    stat = os.stat(fpath)
+    token = f'{os.path.abspath(fpath)}|{stat.st_size}|{stat.st_mtime_ns}|{version}'
+    return hashlib.sha1(token.encode('utf-8')).hexdigest()[:16]
+
+
+class DiskCache(object):
+    """
+        This is a class for persisting normalized tables on disk, keyed by table, year, source-file fingerprint and
+        column projection
+    """
+    def __init__(self, cache_dir:str):
+        """Creates an on-disk cache in the given directory. The directory is created on the first write.
+
+        Params:
+            cache_dir (str): Directory in which the cached tables are stored
+
+        Note: Tables are stored as pickles since the normalized tables contain object columns with mixed
+              int/float/str/datetime values that columnar formats (Parquet/Feather) cannot round-trip losslessly.
+        """
+        self.cache_dir = cache_dir
+
+    def _path(self, table:str, year:int, fingerprint:str, columns:list=None) -> str:
+        if columns is None:
+            return os.path.join(self.cache_dir, f'{table}_{year}_{fingerprint}.pkl')
+        projection = hashlib.sha1('|'.join(columns).encode('utf-8')).hexdigest()[:8]
+        return os.path.join(self.cache_dir, f'{table}_{year}_{projection}_{fingerprint}.pkl')
+
+    def _entries(self, table:str, year:int) -> list:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        prefix = f'{table}_{year}_'
+        return [os.path.join(self.cache_dir, file) for file in os.listdir(self.cache_dir)
+                if file.startswith(prefix) and file.endswith('.pkl')]
+
+    def get(self, table:str, year:int, fingerprint:str, columns:list=None):
+        """Returns the cached table for the given table, year, fingerprint and projection
+
+        Args:
+            table (str): Table name (e.g. 'T08')
+            year (int): Year of the table
+            fingerprint (str): Fingerprint of the source file (see file_fingerprint)
+            columns (list): Normalized names of the projected columns (default: None, the full table)
+
+        Returns:
+            table (DataFrame): The cached table or None if there is no valid entry
+        """
+        path = self._path(table, year, fingerprint, columns)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception:
+            # corrupted or incompatible entry, treat as miss and let the next write replace it
+            return None
+
+    def put(self, table:str, year:int, fingerprint:str, df:pd.DataFrame, columns:list=None):
+        """Stores a table in the cache and removes stale entries (other fingerprints) of the same table and year,
+           the entries of other projections of the same fingerprint are kept
+
+        Args:
+            table (str): Table name (e.g. 'T08')
+            year (int): Year of the table
+            fingerprint (str): Fingerprint of the source file (see file_fingerprint)
+            df (pd.DataFrame): Normalized table
+            columns (list): Normalized names of the projected columns (default: None, the full table)
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(table, year, fingerprint, columns)
+        for stale in self._entries(table, year):
+            if not stale.endswith(f'_{fingerprint}.pkl'):
+                os.remove(stale)
+        # write to a temporary file first so that concurrent readers never see a partial file
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+
+    def clear(self, table:str=None):
+        """Removes cached tables
+
+        Args:
+            table (str): Only remove entries of this table, removes all entries if not specified (default: None)
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        for file in os.listdir(self.cache_dir):
+            if file.endswith('.pkl') and (table is None or file.startswith(f'{table}_')):
+                os.remove(os.path.join(self.cache_dir, file))
+
+
+def _copy_on_write_enabled() -> bool:
+    """Returns whether pandas copy-on-write is active, in which case shallow copies are safe to hand out
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+class FrameCache(object):
+    """
+        This is a class for memoizing loaded tables in memory with bounded, size-aware LRU eviction
+    """
+    def __init__(self, max_bytes:int=512 * 2**20, max_entries:int=64):
+        """Creates an in-memory LRU cache of DataFrames
+
+        Params:
+            max_bytes (int): Maximum total memory of the cached frames in bytes (default: 512 MiB)
+            max_entries (int): Maximum number of cached frames (default: 64)
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # key -> (frame, size in bytes)
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def nbytes(self) -> int:
+        """Total memory of the cached frames in bytes
+        """
+        return self._nbytes
+
+    def _copy(self, df:pd.DataFrame) -> pd.DataFrame:
+        # callers must never be able to modify the cached frame: with copy-on-write a shallow copy
+        # is enough, otherwise a deep copy is made (still orders of magnitude cheaper than parsing)
+        return df.copy(deep=not _copy_on_write_enabled())
+
+    def get(self, key):
+        """Returns a copy of the cached frame for the given key
+
+        Args:
+            key: Hashable cache key
+
+        Returns:
+            table (DataFrame): Copy of the cached frame or None if the key is not cached
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._copy(entry[0])
+
+    def put(self, key, df:pd.DataFrame):
+        """Stores a private copy of a frame and evicts the least recently used frames if a limit is exceeded.
+           Frames larger than max_bytes are not cached.
+
+        Args:
+            key: Hashable cache key
+            df (pd.DataFrame): Frame to cache
+        """
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        df = self._copy(df)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self._nbytes += size
+            self._evict()
+
+    def _evict(self):
+        # drop least recently used frames until both limits hold, the caller holds the lock
+        while self._entries and (len(self._entries) > self.max_entries or self._nbytes > self.max_bytes):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._nbytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all frames from the cache, the counters are kept
+        """
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def stats(self) -> dict:
+        """Returns the cache counters
+
+        Returns:
+            stats (dict): hits, misses, evictions, number of entries and memory in bytes
+        """
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'nbytes': self._nbytes}
+
+
+# Cache shared by all loaders of the process
+frame_cache = FrameCache()
+
+
+def configure_frame_cache(max_bytes:int=None, max_entries:int=None):
+    """Changes the limits of the shared in-memory cache and evicts frames if necessary
+
+    Args:
+        max_bytes (int): Maximum total memory of the cached frames in bytes (default: None, unchanged)
+        max_entries (int): Maximum number of cached frames (default: None, unchanged)
+    """
+    if max_bytes is not None:
+        frame_cache.max_bytes = max_bytes
+    if max_entries is not None:
+        frame_cache.max_entries = max_entries
+    with frame_cache._lock:
+        frame_cache._evict()
@@ -0,0 +1,198 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from .DataCache import get_default_cache_dir
+from .DataPanel import update_panel, FEDERAL_TERRITORY, PANEL_MANIFEST_FILE
+from .Instrumentation import stage
+
+# Bump when the layout of the cube files changes, so that existing cubes are rebuilt
+CUBE_VERSION = 1
+# Sidecar index of the cube directory, the arrays are stored as <table>.npy next to it
+CUBE_INDEX_FILE = 'cube_index.json'
+# Axes of the arrays, federal tables (T01, T08, T20) have no Bundesland axis
+CUBE_AXES = ['year', 'Bundesland', 'Schlüssel', 'metric']
+
+
+def _table_array(panel:pd.Series, table:str, dtype) -> tuple:
+    """Scatters the values of one table of the panel into a dense array, cells without a value are NaN
+
+    Returns:
+        axes (dict): Labels of every axis of the array
+        values (np.ndarray): Values of shape (year, [Bundesland,] Schlüssel, metric)
+    """
+    values = panel.xs(table, level='table')
+    axes = dict()
+    codes = []
+    for axis in CUBE_AXES:
+        labels = values.index.get_level_values(axis)
+        if axis == 'year':
+            labels = labels.astype(int)
+        else:
+            labels = labels.astype(str)
+        if axis == 'Bundesland' and (labels == FEDERAL_TERRITORY).all():
+            continue # federal table
+        axis_codes, uniques = pd.factorize(labels, sort=True)
+        axes[axis] = uniques.tolist()
+        codes.append(axis_codes)
+    array = np.full([len(labels) for labels in axes.values()], np.nan, dtype=dtype)
+    array[tuple(codes)] = values.to_numpy()
+    return axes, array
+
+
+def _write_atomic(path:str, write, mode:str='wb'):
+    # write to a temporary file first, processes that already mapped the old file keep reading it
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def export_cube(panel:pd.Series, cube_dir:str, tables:list=None, dtype=np.float64, source:dict=None) -> dict:
+    """Exports the panel as one dense .npy array per table and a JSON sidecar with the labels of the axes.
+       The arrays can be opened memory-mapped by any number of processes (see DataCube), which then share the
+       page cache instead of holding their own copies of the tables.
+
+    Args:
+        panel (pd.Series): Panel created by build_panel or update_panel
+        cube_dir (str): Directory of the cube files
+        tables (list): Tables to export (default: None, all tables of the panel)
+        dtype: Type of the values, missing values are NaN (default: np.float64)
+        source (dict): Fingerprints of the source files, stored in the index to detect outdated cubes (default: None)
+
+    Returns:
+        index (dict): Content of the sidecar index
+    """
+    tables = sorted(tables if tables is not None else panel.index.get_level_values('table').unique().astype(str))
+    os.makedirs(cube_dir, exist_ok=True)
+    index = {'version': CUBE_VERSION, 'source': source, 'tables': dict()}
+    for table in tables:
+        with stage('cube.export', table=table) as st:
+            axes, array = _table_array(panel, table, dtype)
+            fname = f'{table}.npy'
+            _write_atomic(os.path.join(cube_dir, fname), lambda f: np.save(f, array))
+            index['tables'][table] = {'file': fname, 'dtype': array.dtype.str, 'shape': list(array.shape),
+                                      'axes': axes}
+            st.record(array)
+    # the index is written last, so readers never see an index describing arrays that do not exist yet
+    _write_atomic(os.path.join(cube_dir, CUBE_INDEX_FILE),
+                  lambda f: json.dump(index, f, ensure_ascii=False), mode='w')
+    return index
+
+
+class DataCube(object):
+    """
+        This is a class giving read-only access to a cube exported by export_cube. The arrays are memory-mapped
+        on first access, pickling the cube (e.g. to send it to worker processes) only transfers the index and
+        every process maps the files itself.
+    """
+    def __init__(self, cube_dir:str):
+        """Opens the cube in the given directory
+
+        Params:
+            cube_dir (str): Directory of the cube files
+
+        Raises:
+            FileNotFoundError: If the directory contains no cube
+        """
+        self.cube_dir = cube_dir
+        with open(os.path.join(cube_dir, CUBE_INDEX_FILE), encoding='utf-8') as f:
+            self.index = json.load(f)
+        self.tables = list(self.index['tables'].keys())
+        self._arrays = dict()
+        # label -> position per table and axis
+        self._positions = {table: {axis: {label: i for i, label in enumerate(labels)}
+                                   for axis, labels in info['axes'].items()}
+                           for table, info in self.index['tables'].items()}
+
+    def __getstate__(self):
+        return {'cube_dir': self.cube_dir}
+
+    def __setstate__(self, state):
+        self.__init__(state['cube_dir'])
+
+    def array(self, table:str) -> np.ndarray:
+        """Returns the memory-mapped array of a table (read-only), see axes for the labels
+
+        Args:
+            table (str): Table name (e.g. 'LKS01')
+        """
+        if table not in self._arrays:
+            info = self.index['tables'][table]
+            self._arrays[table] = np.load(os.path.join(self.cube_dir, info['file']), mmap_mode='r')
+        return self._arrays[table]
+
+    def axes(self, table:str) -> dict:
+        """Returns the labels of the axes of a table, keyed by axis name (see CUBE_AXES)
+        """
+        return self.index['tables'][table]['axes']
+
+    def select(self, table:str, years=None, keys=None, metrics=None, bundesland=None) -> np.ndarray:
+        """Returns a copy of the values of a table, each argument can be a single label or a list of labels.
+           A single label removes its axis from the result.
+
+        Args:
+            table (str): Table name (e.g. 'T01')
+            years: Year(s) (default: None, all years)
+            keys: Crime key(s) (default: None, all keys)
+            metrics: Metric(s), e.g. 'Anzahl erfasste Fälle' (default: None, all metrics)
+            bundesland: Federal state(s), only for LKS01 (default: None, all federal states)
+
+        Raises:
+            KeyError: If a label does not exist in the table
+
+        Returns:
+            values (np.ndarray): Values with the remaining axes in the order of CUBE_AXES, NaN for missing values
+        """
+        selection = {'year': years, 'Bundesland': bundesland, 'Schlüssel': keys, 'metric': metrics}
+        values = self.array(table)
+        indexer = []
+        for axis in self.axes(table):
+            labels = selection[axis]
+            positions = self._positions[table][axis]
+            if labels is None:
+                indexer.append(slice(None))
+            elif isinstance(labels, (list, tuple, range, np.ndarray, pd.Index)):
+                indexer.append(np.array([positions[label] for label in labels], dtype=np.int64))
+            else:
+                indexer.append(positions[labels])
+        # index the list axes one after the other, so they are not broadcast against each other
+        result = values[tuple(i if not isinstance(i, np.ndarray) else slice(None) for i in indexer)]
+        axis = 0
+        for i in indexer:
+            if isinstance(i, np.ndarray):
+                result = np.take(result, i, axis=axis)
+            if not np.isscalar(i):
+                axis += 1
+        return np.array(result)
+
+
+def update_cube(root_dir:str='../dat/PKS/', tables:list=None, cube_dir:str=None, cache_dir:str=None,
+                workers:int=None) -> DataCube:
+    """Updates the panel (see update_panel, only new or changed tables are parsed) and exports it as cube
+       if a source file changed since the last export.
+
+    Args:
+        root_dir (str): The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+        tables (list): Names of the tables to include, see PANEL_LOADERS (default: None, all tables)
+        cube_dir (str): Directory of the cube files (default: None, 'cube' directory in cache_dir)
+        cache_dir (str): Directory of the persisted panel (default: None, 'cache' directory next to root_dir)
+        workers (int): Number of worker processes used to parse the tables (default: None, one per CPU)
+
+    Returns:
+        cube (DataCube): Cube of the current tables
+    """
+    cache_dir = cache_dir if cache_dir is not None else get_default_cache_dir(root_dir)
+    cube_dir = cube_dir if cube_dir is not None else os.path.join(cache_dir, 'cube')
+    panel, _, _ = update_panel(root_dir, tables, workers=workers, cache_dir=cache_dir)
+    with open(os.path.join(cache_dir, PANEL_MANIFEST_FILE)) as f:
+        source = json.load(f)['files']
+
+    index_path = os.path.join(cube_dir, CUBE_INDEX_FILE)
+    if os.path.exists(index_path):
+        with open(index_path, encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == CUBE_VERSION and index.get('source') == source:
+            return DataCube(cube_dir)
+    export_cube(panel, cube_dir, source=source)
+    return DataCube(cube_dir)
@@ -1,5 +1,6 @@
+import numpy as np
 import pandas as pd
-import geopandas as gpd
+from .Instrumentation import instrument
 
 def get_months():
     """
@@ -40,6 +41,7 @@ def get_column_with_value(data:pd.DataFrame, column:str, value):
     return data[data[column] == value]
     
 
+@instrument('DataFunctions.get_cases_by_key')
 def get_cases_by_key(data:pd.DataFrame, key:str):
     """ 
         Returns cases of the crime table with a given crime key
@@ -53,21 +55,30 @@ def get_cases_by_key(data:pd.DataFrame, key:str):
     """
     return get_column_with_value(data, 'Schlüssel', key)
 
-def transform_df_to_list(data:pd.DataFrame, years:range):
+@instrument('DataFunctions.transform_df_to_list')
+def transform_df_to_list(data:pd.DataFrame, years:range, workers:int=None):
     """returns list of tuples. Each elements represents one year the crime table of that year in the tuple
 
     Args:
         data (pd.DataFrame): Crime Table
         years (range): years of crime tables
+        workers (int): If given, the tables are loaded with data.load_many using this many worker processes (default: None)
 
     Returns:
         lists of years (list(tuple)): List of data for each year. Tuple: (year, crime table of year)
     """
+    if workers is not None and hasattr(data, 'load_many'):
+        tables, errors = data.load_many(years, workers=workers)
+        if len(errors) > 0:
+            year, error = next(iter(errors.items()))
+            raise Exception(f'Could not load data for {year}') from error
+        return list(tables.items())
     df = list()
     for year in years:
         df.append((year, data[year]))
     return df
 
+@instrument('DataFunctions.get_monthly_cases')
 def get_monthly_cases(df_year:pd.DataFrame, key:str, sum_duplicated_key:bool):
     """Returns Lists values of monthly granularity data.
 
@@ -79,22 +90,50 @@ def get_monthly_cases(df_year:pd.DataFrame, key:str, sum_duplicated_key:bool):
     Returns:
         monthly data (list): Monthly data of a year comprised in a list of lists
     """
-    cases_curr_year = list() 
-    months = get_months()           
-    for month in months:
+    rows = df_year.loc[df_year['Schlüssel'] == key, get_months()]
+    if sum_duplicated_key:
+        # summing up the entries in df that have an identical key
+        return rows.sum().tolist()
+    # taking only the first entry that uses the key in df
+    return rows.iloc[0].tolist()
+
+
+@instrument('DataFunctions.get_monthly_cases_by_keys')
+def get_monthly_cases_by_keys(data:list[tuple[int, pd.DataFrame]], keys:list, sum_duplicated_key:bool):
+    """Returns the monthly cases of many crime keys for all years in one array.
+       Years missing between the first and the last year of data are filled with zeros (like
+       transform_monthly_data_to_list), as are keys that do not exist in a year.
+
+    Args:
+        data (list[tuple[int, pd.DataFrame]]): Generated by transform_df_to_list, sorted by year
+        keys (list): Crime keys
+        sum_duplicated_key (bool): Whether rows with the same key should be summed up, otherwise the first row is taken
+
+    Returns:
+        years (list): All years from the first to the last year in data
+        cases (np.ndarray): Cases of shape (len(keys), len(years), 12), months from January to December
+    """
+    months = get_months()
+    keys = list(keys)
+    yearly_cases = dict()
+    for year, df_year in data:
+        rows = df_year.loc[df_year['Schlüssel'].isin(keys), ['Schlüssel'] + months]
         if sum_duplicated_key:
-            # summing up the entries in df that have an identical key
-            cases_month = 0
-            for i in range(len(df_year[month][df_year['Schlüssel'] == key])):
-                cases_month += df_year[month][df_year['Schlüssel'] == key].iloc[i]
+            rows = rows.groupby('Schlüssel', sort=False, observed=True)[months].sum()
         else:
-            # taking only the first entry that uses the key in df
-            cases_month = df_year[month][df_year['Schlüssel'] == key].iloc[0]
-        
-        cases_curr_year.append(cases_month)
-    return cases_curr_year
-            
+            rows = rows.drop_duplicates('Schlüssel', keep='first').set_index('Schlüssel')
+        yearly_cases[year] = rows.reindex(keys, fill_value=0).to_numpy()
 
+    if len(yearly_cases) == 0:
+        return [], np.zeros((len(keys), 0, 12), dtype=int)
+    years = list(range(min(yearly_cases), max(yearly_cases) + 1))
+    cases = np.zeros((len(keys), len(years), 12), dtype=np.result_type(*yearly_cases.values()))
+    for year, year_cases in yearly_cases.items():
+        cases[:, year - years[0], :] = year_cases
+    return years, cases
+
+
+@instrument('DataFunctions.transform_monthly_data_to_list')
 def transform_monthly_data_to_list(data:list[tuple[int, pd.DataFrame]], key:str, sum_duplicated_key:bool):
     """ Returns list of lists. 
         Each list represents one year and contains cases of certain crime from Jan. to Dec.
@@ -159,6 +198,7 @@ def create_x_labels(years, use_english_months:bool=False):
     return flat_months_year
 
 
+@instrument('DataFunctions.get_key_col')
 def get_key_col(df:pd.DataFrame,key:str,col:str=None) -> pd.Series:
     '''Copy slice of data frame specified by key and column
     
@@ -174,19 +214,27 @@ def get_key_col(df:pd.DataFrame,key:str,col:str=None) -> pd.Series:
     return pd.DataFrame(df.loc[df.Schlüssel == key, ['Bundesland',col]]).rename(columns={col:'data'}).reset_index(drop=True)
 
 
-def add_geomery(df:pd.DataFrame,geo:gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+@instrument('DataFunctions.add_geomery')
+def add_geomery(df:pd.DataFrame,geo:'gpd.GeoDataFrame'=None,tolerance:str='medium') -> 'gpd.GeoDataFrame':
     '''Adds geometry of federal states to slice of data frame
-    
+
     Params:
     df: Data frame containing data per federal state (requires: 'Bundesland' column)
     geo: Geo data frame containing the geometry of each federal state (requires: 'Bundesland' column)
-    
+         If not given, the cached simplified state geometry is loaded (see GeoFunctions.load_region_geometry)
+    tolerance: Simplification level of the cached geometry, only used without geo ('full', 'fine', 'medium', 'coarse')
+
     Returns: Augmented data with geometry ready for plotting'''
 
+    import geopandas as gpd # imported here, so that the non-spatial functions do not depend on geopandas
+    if geo is None:
+        from .GeoFunctions import load_region_geometry
+        geo = load_region_geometry('Bundesland', tolerance)[['Bundesland','geometry']]
     return gpd.GeoDataFrame(pd.merge(df,geo,on='Bundesland'),geometry='geometry')
 
 
 # Methods that are not used anymore but might be needed again
+@instrument('DataFunctions.get_yearly_cases_by_key')
 def get_yearly_cases_by_key(key:str, data:tuple((int, pd.DataFrame)), sum_same_key:bool, column_of_interest:str='Anzahl erfasste Fälle'):
     """_summary_
 
@@ -201,17 +249,59 @@ def get_yearly_cases_by_key(key:str, data:tuple((int, pd.DataFrame)), sum_same_k
     """
     cases_by_year = list()
     data_years = list()
-    for year, df in data:      
+    for year, df in data:
+        rows = df.loc[df['Schlüssel'] == key, column_of_interest]
         if sum_same_key:
             # summing up the entries in df that have an identical key
-            cases_curr_year = 0
-            for i in range(len(df[column_of_interest][df['Schlüssel'] == key])):
-                cases_curr_year += df[column_of_interest][df['Schlüssel'] == key].iloc[i]
+            cases_curr_year = rows.sum()
         else:
             # taking only the first entry that uses the key in df
-            cases_curr_year = df[column_of_interest][df['Schlüssel'] == key].iloc[0]
-            
+            cases_curr_year = rows.iloc[0]
+
         cases_by_year.append(cases_curr_year)
         data_years.append(year)
 
-    return data_years, cases_by_year
\ No newline at end of file
+    return data_years, cases_by_year
+
+
+@instrument('DataFunctions.get_yearly_cases_by_keys')
+def get_yearly_cases_by_keys(keys:list, data:list[tuple[int, pd.DataFrame]], columns:list=None, duplicates:str='sum', as_frame:bool=False):
+    """Returns the yearly values of many crime keys and columns in one pass per year.
+       Non-numeric cells, keys missing in a year and columns missing in a year result in NaN.
+
+    Args:
+        keys (list): Crime keys
+        data (list[tuple[int, pd.DataFrame]]): Generated by transform_df_to_list
+        columns (list): Columns of interest (default: None, ['Anzahl erfasste Fälle'])
+        duplicates (str): How rows with the same key are combined, 'sum' or 'first' (default: 'sum')
+        as_frame (bool): Whether a DF indexed by (Schlüssel, Jahr) with one column per column of interest is returned (default: False)
+
+    Raises:
+        ValueError: If duplicates is neither 'sum' nor 'first'
+
+    Returns:
+        years (list): Years of data
+        cases (np.ndarray): Values of shape (len(keys), len(years), len(columns)), only returned if as_frame is False
+        or
+        cases (pd.DataFrame): Values indexed by Schlüssel and Jahr, only returned if as_frame is True
+    """
+    if duplicates not in ['sum', 'first']:
+        raise ValueError(f"Unknown duplicate policy: {duplicates}. Use 'sum' or 'first'")
+    keys = list(keys)
+    columns = list(columns) if columns is not None else ['Anzahl erfasste Fälle']
+    years = [year for year, _ in data]
+    cases = np.full((len(keys), len(years), len(columns)), np.nan)
+    for i, (year, df) in enumerate(data):
+        available = [col for col in columns if col in df.columns]
+        rows = df.loc[df['Schlüssel'].isin(keys), ['Schlüssel'] + available]
+        rows[available] = rows[available].apply(pd.to_numeric, errors='coerce')
+        if duplicates == 'sum':
+            rows = rows.groupby('Schlüssel', sort=False, observed=True)[available].sum(min_count=1)
+        else:
+            rows = rows.drop_duplicates('Schlüssel', keep='first').set_index('Schlüssel')
+        cases[:, i, :] = rows.reindex(index=keys, columns=columns).to_numpy(dtype=float)
+
+    if as_frame:
+        index = pd.MultiIndex.from_product([keys, years], names=['Schlüssel', 'Jahr'])
+        return years, pd.DataFrame(cases.reshape(len(keys) * len(years), len(columns)), index=index, columns=columns)
+    return years, cases
@@ -1,111 +1,266 @@
 import os
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
+from .DataCache import DiskCache, file_fingerprint, get_default_cache_dir, frame_cache
+from .Schemas import TableSchema, get_schema, get_years
+from .Instrumentation import stage, count
 
-class T20DataLoader(object):
+# Version of the normalization code below. Increase it whenever the output of a loader changes,
+# so that tables cached on disk by an older version are invalidated.
+LOADER_VERSION = 4
+
+# Columns describing a row, they are stored as categoricals by compact_table
+CATEGORICAL_COLUMNS = ['Schlüssel', 'Straftat', 'Bundesland', 'Sex']
+
+# Engines used by read_table to parse the workbooks: 'calamine' (python-calamine, several times faster and with
+# identical tables for all years), 'default' (the engine pandas picks: openpyxl for .xlsx, xlrd for .xls) or
+# 'auto' (calamine if it is installed, otherwise default)
+EXCEL_BACKENDS = ['auto', 'calamine', 'default']
+_excel_backend = 'auto'
+
+
+def set_excel_backend(backend:str):
+    """Selects the engine used by all loaders to parse the workbooks, see EXCEL_BACKENDS
+
+    Args:
+        backend (str): 'auto', 'calamine' or 'default'
+
+    Raises:
+        ValueError: If the backend is unknown
     """
-        This is a class for loading T20 tables
+    global _excel_backend
+    if backend not in EXCEL_BACKENDS:
+        raise ValueError(f'Unknown Excel backend: {backend}. Use one of {EXCEL_BACKENDS}')
+    _excel_backend = backend
+
+
+def get_excel_backend(backend:str=None) -> str:
+    """Resolves a backend to the engine that is used
+
+    Args:
+        backend (str): Backend of EXCEL_BACKENDS (default: None, the backend selected by set_excel_backend)
+
+    Returns:
+        backend (str): 'calamine' or 'default'
     """
-    def __init__(self,root_dir:str='../dat/PKS/'):
-        """Creates an object that can load the PKS tables of Germany grouped by suspect age and sex for all available years in the root directory
+    backend = backend if backend is not None else _excel_backend
+    if backend == 'auto':
+        return 'calamine' if importlib.util.find_spec('python_calamine') is not None else 'default'
+    return backend
+
+
+def _read_excel(fpath:str, backend:str, **kwargs) -> pd.DataFrame:
+    """Reads a workbook with the given backend, falls back to the default engines if calamine is not available or
+       does not support the file. Other errors of calamine are raised, so both backends stay comparable
+    """
+    if backend == 'calamine':
+        try:
+            return pd.read_excel(fpath, engine='calamine', **kwargs)
+        except (ImportError, ValueError): # ImportError: not installed, ValueError: engine or format unknown
+            count('read_table.excel_fallback')
+    return pd.read_excel(fpath, **kwargs)
+
+def read_table(fpath:str, schema:TableSchema, columns:list=None, backend:str=None) -> pd.DataFrame:
+    """Parses and normalizes a PKS table according to its layout
+
+    Args:
+        fpath (str): file path
+        schema (TableSchema): Layout of the table
+        columns (list): Normalized names of the columns to parse, unknown names are ignored (default: None, all columns)
+        backend (str): Engine of EXCEL_BACKENDS (default: None, the backend selected by set_excel_backend)
+
+    Returns:
+        table (DataFrame): Normalized table
+    """
+    def _normalized_name(col):
+        if schema.numbered_header and isinstance(col, str) and not col.startswith('Unnamed'):
+            col = int(col)
+        return schema.rename.get(col, col)
+
+    def _parse_column(col) -> bool:
+        # columns of the layout (and of the projection), checked by the parser so that other columns are not converted
+        name = _normalized_name(col)
+        return (schema.usecols is None or name in schema.usecols) and (columns is None or name in columns)
+
+    if schema.names is not None:
+        # tables without header: the columns are selected by their position
+        positions = [i for i, col in enumerate(schema.names) if _parse_column(col)]
+        usecols, names = positions, [schema.names[i] for i in positions]
+    else:
+        usecols, names = _parse_column, None
+
+    dtype = None
+    if schema.dtype is not None:
+        # the types are declared for the normalized names, the parser expects the names in the file. Numbers in a
+        # header can be str or int depending on the year and int keys that are no column name would be read as
+        # positions by pandas, so they are only passed as str or if they are given names (the columns are converted
+        # after renaming otherwise)
+        dtype = dict(schema.dtype)
+        for col, name in schema.rename.items():
+            if name in schema.dtype:
+                dtype[str(col) if schema.numbered_header else col] = schema.dtype[name]
+        if names is not None:
+            dtype = {col: col_type for col, col_type in dtype.items() if col in names}
+
+    skiprows = schema.skiprows
+    if schema.drop_rows > 0:
+        # rows between the header and the data (e.g. column numbers) are skipped by the parser, so they do not
+        # prevent typed columns
+        skiprows = list(range(schema.skiprows)) + list(range(schema.skiprows + 1, schema.skiprows + 1 + schema.drop_rows))
+
+    backend = get_excel_backend(backend)
+    with stage('read_table.read_excel', table=schema.table, file=os.path.basename(fpath), backend=backend) as st:
+        df = _read_excel(fpath, backend, skiprows=skiprows, thousands=schema.thousands, decimal=schema.decimal,
+                         usecols=usecols, names=names, dtype=dtype)
+        st.record(df)
+    with stage('read_table.normalize', table=schema.table) as st:
+        if schema.numbered_header:
+            # convert the column names to integers (if possible) -> Necessary because of typing errors in column numbers.
+            df = df.rename(columns=lambda col: int(col) if (isinstance(col, str) and not col.startswith('Unnamed')) else col)
+        df = df.rename(columns=schema.rename)
+        if schema.dtype is not None:
+            for col, col_type in schema.dtype.items():
+                if col in df.columns and df[col].dtype != col_type:
+                    df[col] = df[col].astype(col_type)
+        for col, mapping in schema.replace.items():
+            if col in df.columns:
+                df[col] = df[col].replace(mapping)
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        df = df.reset_index(drop=True)
+        st.record(df)
+    return df
+
+
+def compact_table(df:pd.DataFrame) -> pd.DataFrame:
+    """Converts a table to compact dtypes: repeating descriptive columns to categoricals, counts to (nullable) 32 bit integers
+       and other numeric columns, like percentages, to float32. Columns with non-numeric values (e.g. dates) are kept.
+
+    Args:
+        df (pd.DataFrame): Normalized table
+
+    Returns:
+        table (DataFrame): Table with compact dtypes
+    """
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if col in CATEGORICAL_COLUMNS:
+            # categoricals only save memory if values repeat (e.g. keys per federal state)
+            if values.nunique() < len(values) / 2:
+                df[col] = values.astype(str).astype('category') if col == 'Schlüssel' else values.astype('category')
+            continue
+        numeric = pd.to_numeric(values, errors='coerce')
+        if numeric.notna().sum() != values.notna().sum() or not (pd.api.types.is_numeric_dtype(numeric) and not pd.api.types.is_bool_dtype(numeric)):
+            continue # non-numeric content
+        finite = numeric.dropna()
+        is_integral = len(finite) > 0 and np.all(np.mod(finite, 1) == 0)
+        if is_integral and finite.min() >= np.iinfo(np.int32).min and finite.max() <= np.iinfo(np.int32).max:
+            if numeric.isna().any():
+                df[col] = numeric.astype('UInt32' if finite.min() >= 0 else 'Int32')
+            else:
+                df[col] = numeric.astype(np.int32)
+        else:
+            df[col] = numeric.astype(np.float32)
+    return df
+
+
+def get_memory_footprint(df:pd.DataFrame) -> int:
+    """Returns the memory used by a table including the contents of object columns
+
+    Args:
+        df (pd.DataFrame): Table
+
+    Returns:
+        footprint (int): Memory in bytes
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class PKSDataLoader(object):
+    """
+        This is a base class for the PKS table loaders. The layout of the tables of each year is looked up in
+        the schema registry (see Schemas.py), normalized tables are cached in memory and on disk.
+    """
+    table = None
+
+    def __init__(self,root_dir:str='../dat/PKS/',use_cache:bool=True,cache_dir:str=None,columns:list=None,compact:bool=False):
+        """Creates a loader for the yearly directories of tables in the root directory
 
         Params:
             root_dir (str): The root directory containing the yearly directories of tables (default: '../dat/PKS/')
-
-        Returns: Iterable dataset indexed by years
+            use_cache (bool): Whether normalized tables are cached on disk (default: True)
+            cache_dir (str): Directory of the on-disk cache (default: 'cache' directory next to root_dir)
+            columns (list): Normalized names of the columns to load, unknown names are ignored (default: None, all columns)
+            compact (bool): Whether tables are converted to compact dtypes, see compact_table (default: False)
         """
         self.root_dir = root_dir
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir if cache_dir is not None else get_default_cache_dir(root_dir)
+        self.columns = list(columns) if columns is not None else None
+        self.compact = compact
+        # memory in bytes of the loaded tables before and after projection/compaction, keyed by year
+        self.memory_footprint = dict()
 
-    def __len__(self):
-        """Returns the amount of files in the root_dir
-
-        Returns:
-            length (int): Amount of files in root_dir
-        """
-        return len(os.listdir(self.root_dir)) # assume this table exists for each year
-    
-    def __getitem__(self,year:int):
-        """Returns a Pandas DF with the respective T20 table of the given year.
+    def get_file(self, year:int) -> tuple:
+        """Returns the source file and the layout of the table of the given year
 
         Args:
-            year (int): Year for which DF is requested
+            year (int): Year for which the table is requested
 
         Raises:
             IndexError: When there is no data for the given year
-            Exception: If the path or file does not exist
+            Exception: If the file does not exist
 
         Returns:
-            T20 table (DataFrame): DF with T20 data from the given year
+            fpath (str): Path of the source file
+            schema (TableSchema): Layout of the table
         """
-        if 2012 > year or year > 2022:
-                raise IndexError(f'No data for requested year: {year}.\nNote: There is no official data before 2012 for this table')
+        schema = get_schema(self.table, year)
+        if schema is None:
+            raise IndexError(f'No data for requested year: {year}.\nNote: There is no official data before {get_years(self.table)[0]} for this table')
 
         y_path = os.path.join(self.root_dir,str(year))
-        
-        files_in_path = [file for file in os.listdir(y_path) if 'BU-T20-Tatverdaechtige.' in file]
+        if not os.path.isdir(y_path):
+            raise IndexError(f'No data for requested year: {year}.\nNote: There is no directory {y_path}')
+        files_in_path = [file for file in sorted(os.listdir(y_path)) if schema.matches(file)]
 
-        # Check whether there is T20 table in the year folder
+        # Check whether there is the table in the year folder
         if(len(files_in_path) == 0):
-            raise Exception(f"T20 table in the folder {y_path} could not be found")
+            raise Exception(f"{self.table} table in the folder {y_path} could not be found")
 
         # If there are multiple, take the first file
-        t20_file_path = os.path.join(y_path, files_in_path[0])
-
-        df = pd.read_excel(t20_file_path,skiprows=8,thousands=',',decimal='.', usecols='A:X', names = list(range(1,25)))
-        renamedCols = {1: 'Schlüssel', 
-                       2: 'Straftat',
-                       3: 'Sex',
-                       4: 'Anzahl erfasste TV',
-                       5: '0-5',
-                       6: '6-7',
-                       7: '8-9',
-                       8: '10-11',
-                       9: '12-13',
-                       10: '0-13',
-                       11: '14-15',
-                       12: '16-17',
-                       13: '14-17',
-                       14: '18-20',
-                       15: '0-20',
-                       16: '21-22', 
-                       17: '23-24',
-                       18: '21-24',
-                       19: '25-29',
-                       20: '30-39',
-                       21: '40-49',
-                       22: '50-59',
-                       23: '>60',
-                       24: '>21'}
-        df = df.rename(columns=renamedCols)
-        # Ensure that keys are always interpreted as strings
-        df['Schlüssel'] = df['Schlüssel'].astype(str)
-        df = df.reset_index(drop=True)
-        
-        return df
-
-class T08DataLoader(object):
-    """
-        This is a class for loading T08 Tables
-    """
-    def __init__(self,root_dir:str='../dat/PKS/'):
-        """Creates an object to load base crime tables of Germany grouped by month for all available years in the root directory
+        return os.path.join(y_path, files_in_path[0]), schema
 
-        Params:
-        root_dir: The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+    def available_years(self) -> list:
+        """Returns the years of the yearly directories in root_dir that contain this table
 
-        Returns: Iterable dataset indexed by years
+        Returns:
+            years (list): Sorted list of years
         """
-        self.root_dir = root_dir
+        years = []
+        for directory in sorted(os.listdir(self.root_dir)):
+            if not directory.isdigit():
+                continue
+            try:
+                self.get_file(int(directory))
+            except Exception: # IndexError: no layout, Exception: no table file
+                continue
+            years.append(int(directory))
+        return years
 
     def __len__(self):
-        """Returns the amount of files in the root_dir
+        """Returns the amount of years for which the table exists in the root_dir
 
         Returns:
-            length (int): Amount of files in root_dir
+            length (int): Amount of yearly directories containing the table
         """
-        return len(os.listdir(self.root_dir)) # assume this table exists for each year
-    
-    def __getitem__(self, year):
-        """Returns a Pandas DF with the respective T08 table of the given year.
+        return len(self.available_years())
+
+    def __getitem__(self, year:int):
+        """Returns a Pandas DF with the respective table of the given year.
 
         Args:
             year (int): Year for which DF is requested
@@ -115,102 +270,196 @@ class T08DataLoader(object):
             Exception: If the path or file does not exist
 
         Returns:
-            T08 table (DataFrame): DF with T08 data from the given year
+            table (DataFrame): DF with the table of the given year
         """
-        if 2012 > year or year > 2022:
-                raise IndexError(f'No data for requested year: {year}.\nNote: There is no official data before 2012 for this table')
-        
-        y_path = os.path.join(self.root_dir,str(year))
-        
-        files_in_path = [file for file in os.listdir(y_path) if 'BU-T08-Tatzeit.' in file]
+        with stage('loader.getitem', table=self.table, year=year) as st:
+            fpath, schema = self.get_file(year)
+            if not self.use_cache:
+                df = read_table(fpath, schema, self.columns)
+                df = self._reduce(year, df) if self.columns is not None or self.compact else df
+            else:
+                df = self._load_cached(year, fpath, lambda fpath, columns: read_table(fpath, schema, columns))
+            st.record(df)
+        return df
 
-        # Check whether there is T08 table in the year folder
-        if(len(files_in_path) == 0):
-            raise Exception(f"T08 table in the folder {y_path} could be found")
-        
-        # If there are multiple, take the first file
-        t08_file_path = os.path.join(y_path, files_in_path[0])
-        rows_to_skip = 6
-        if year == 2015:
-            rows_to_skip = 5
-        df = pd.read_excel(t08_file_path, skiprows=rows_to_skip, thousands=',', decimal='.')
-
-        # convert the column names to integers (if possible) -> Necessary because of typing errors in column numbers. 
-        # Then rename them to the correct names
-        df = df.rename(columns=lambda col: int(col) if (isinstance(col, str) and not col.startswith('Unnamed')) else col)
-        newCols = {1: 'Schlüssel',
-                   2: 'Straftat',
-                   3: 'Anzahl erfasste Fälle',
-                   4:'Jan.',
-                   5:'Febr.',
-                   6:'März',
-                   7: 'April',
-                   8: 'Mai',
-                   9: 'Juni',
-                   10: 'Juli',
-                   11: 'Aug.',
-                   12: 'Sept.',
-                   13: 'Okt.',
-                   14: 'Nov.',
-                   15: 'Dez.',
-                   16: 'Tatzeit unbekannt',
-                   'Unnamed: 2': 'Schlüssel gültig von',
-                   17: 'Schlüssel gültig von',
-                   'Unnamed: 3': 'Schlüssel gültig bis',
-                   18: 'Schlüssel gültig bis',
-                   'Unnamed: 18': 'Sort'}
-        df = df.rename(columns=newCols)
-        df.reset_index(drop=True, inplace=True)
+    def _reduce(self, year:int, df:pd.DataFrame) -> pd.DataFrame:
+        """Applies the column projection and the dtype compaction of the loader and records the memory footprint
+        """
+        before = get_memory_footprint(df)
+        if self.columns is not None:
+            df = df[[col for col in self.columns if col in df.columns]]
+        if self.compact:
+            df = compact_table(df)
+        self.memory_footprint[year] = (before, get_memory_footprint(df))
+        return df
+
+    def _load_cached(self, year:int, fpath:str, load_fn):
+        """Loads a table through the in-memory cache shared by all loaders and the on-disk cache.
+           Entries are keyed by the file path, size, modification time and LOADER_VERSION, stale entries are
+           replaced automatically. The returned frame is a private copy, modifying it does not affect the caches.
+           With a column projection the disk cache is looked up for the projected table first, then for the full
+           table. If neither exists, only the projected columns are parsed and stored as entry of the projection.
 
+        Args:
+            year (int): Year of the table
+            fpath (str): Path of the source file
+            load_fn (callable): Function parsing and normalizing the source file, called with fpath and the
+                                projected columns (None for all columns) on a cache miss
+
+        Returns:
+            table (DataFrame): Normalized table
+        """
+        if not self.use_cache:
+            return load_fn(fpath, self.columns)
+        fingerprint = file_fingerprint(fpath, LOADER_VERSION)
+        # the disk cache holds the full or projected table, the memory cache the projected/compacted one
+        projection = tuple(self.columns) if self.columns is not None else None
+        key = (self.table, year, fingerprint, projection, self.compact)
+        df = frame_cache.get(key)
+        if df is not None:
+            count('cache.memory.hit')
+            return df
+        count('cache.memory.miss')
+        cache = DiskCache(self.cache_dir)
+        with stage('cache.disk.get', table=self.table, year=year) as st:
+            df = cache.get(self.table, year, fingerprint, self.columns)
+            if df is None and self.columns is not None:
+                df = cache.get(self.table, year, fingerprint)
+            st.record(df, hit=df is not None)
+        if df is None:
+            count('cache.disk.miss')
+            df = load_fn(fpath, self.columns)
+            with stage('cache.disk.put', table=self.table, year=year):
+                try:
+                    cache.put(self.table, year, fingerprint, df, self.columns)
+                except OSError:
+                    pass # a read-only cache directory must not break loading
+        else:
+            count('cache.disk.hit')
+        if self.columns is not None or self.compact:
+            with stage('loader.reduce', table=self.table, year=year) as st:
+                df = self._reduce(year, df)
+                st.record(df)
+        frame_cache.put(key, df)
         return df
 
+    def clear_cache(self):
+        """Removes all cached tables of this loader from the on-disk cache
+        """
+        DiskCache(self.cache_dir).clear(self.table)
+
+    def load_many(self, years, workers:int=None, as_frame:bool=False):
+        """Loads the tables of several years, parsing the files in parallel worker processes.
+           A failing year does not abort the batch, its exception is returned instead.
 
-class T01DataLoader(object):
+        Args:
+            years (iterable): Years for which the tables are requested
+            workers (int): Number of worker processes, 1 loads sequentially in this process (default: None, one per CPU)
+            as_frame (bool): Whether the tables are concatenated to one long DF with a 'Jahr' column (default: False)
+
+        Returns:
+            tables (dict | DataFrame): Tables of all successfully loaded years, keyed and ordered by year
+            errors (dict): Exception for every year that could not be loaded, keyed by year
+        """
+        years = list(years)
+        if workers is None:
+            workers = min(len(years), os.cpu_count() or 1)
+        results = {}
+        with stage('loader.load_many', table=self.table, years=len(years), workers=workers):
+            if workers <= 1 or len(years) <= 1:
+                for year in years:
+                    try:
+                        results[year] = self[year]
+                    except Exception as e:
+                        results[year] = e
+            else:
+                # the workers fill the on-disk cache, so later accesses in this process are fast as well
+                # (stages inside the worker processes are not recorded)
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {year: pool.submit(_load_year, self, year) for year in years}
+                    for year, future in futures.items():
+                        try:
+                            results[year] = future.result()
+                        except Exception as e:
+                            results[year] = e
+
+        tables = {year: res for year, res in results.items() if not isinstance(res, Exception)}
+        errors = {year: res for year, res in results.items() if isinstance(res, Exception)}
+        if as_frame:
+            if len(tables) == 0:
+                return pd.DataFrame(columns=['Jahr']), errors
+            tables = pd.concat(tables, names=['Jahr']).reset_index(level=0).reset_index(drop=True)
+        return tables, errors
+
+
+def _load_year(loader:PKSDataLoader, year:int):
+    """Loads the table of one year, used as task of the worker processes in PKSDataLoader.load_many
     """
-        This is a class for loading T01 tables
+    return loader[year]
+
+
+class T20DataLoader(PKSDataLoader):
     """
-    def __init__(self,root_dir:str='../dat/PKS/'):
-        """Creates an object to load base crime tables of Germany containing a multitide of informaiton, like the percentage of solved crimes for crimes of a year in the root directory.
+        This is a class for loading T20 tables
+    """
+    table = 'T20'
+
+    def __init__(self,root_dir:str='../dat/PKS/',use_cache:bool=True,cache_dir:str=None,columns:list=None,compact:bool=False):
+        """Creates an object that can load the PKS tables of Germany grouped by suspect age and sex for all available years in the root directory
 
         Params:
-        root_dir: The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+            root_dir (str): The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+            use_cache (bool): Whether normalized tables are cached on disk (default: True)
+            cache_dir (str): Directory of the on-disk cache (default: 'cache' directory next to root_dir)
+            columns (list): Normalized names of the columns to load (default: None, all columns)
+            compact (bool): Whether tables are converted to compact dtypes, see compact_table (default: False)
 
         Returns: Iterable dataset indexed by years
         """
-        self.root_dir = root_dir
+        super().__init__(root_dir, use_cache, cache_dir, columns, compact)
 
-    def __len__(self):
-        """Returns the amount of files in the root_dir
 
-        Returns:
-            length (int): Amount of files in root_dir
+class T08DataLoader(PKSDataLoader):
+    """
+        This is a class for loading T08 Tables
+    """
+    table = 'T08'
+
+    def __init__(self,root_dir:str='../dat/PKS/',use_cache:bool=True,cache_dir:str=None,columns:list=None,compact:bool=False):
+        """Creates an object to load base crime tables of Germany grouped by month for all available years in the root directory
+
+        Params:
+        root_dir: The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+        use_cache: Whether normalized tables are cached on disk (default: True)
+        cache_dir: Directory of the on-disk cache (default: 'cache' directory next to root_dir)
+        columns: Normalized names of the columns to load (default: None, all columns)
+        compact: Whether tables are converted to compact dtypes, see compact_table (default: False)
+
+        Returns: Iterable dataset indexed by years
         """
-        return len(os.listdir(self.root_dir)) # assume this table exists for each year
-    
-    def __getitem__(self,year:int):
-        """Returns a Pandas DF with the respective T01 table of the given year.
+        super().__init__(root_dir, use_cache, cache_dir, columns, compact)
 
-        Args:
-            year (int): Year for which DF is requested
 
-        Raises:
-            IndexError: When there is no data for the given year
-            Exception: If the path or file does not exist
+class T01DataLoader(PKSDataLoader):
+    """
+        This is a class for loading T01 tables
+    """
+    table = 'T01'
 
-        Returns:
-            T01 table (DataFrame): DF with T01 data from the given year
+    def __init__(self,root_dir:str='../dat/PKS/',use_cache:bool=True,cache_dir:str=None,columns:list=None,compact:bool=False):
+        """Creates an object to load base crime tables of Germany containing a multitide of informaiton, like the percentage of solved crimes for crimes of a year in the root directory.
+
+        Params:
+        root_dir: The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+        use_cache: Whether normalized tables are cached on disk (default: True)
+        cache_dir: Directory of the on-disk cache (default: 'cache' directory next to root_dir)
+        columns: Normalized names of the columns to load (default: None, all columns)
+        compact: Whether tables are converted to compact dtypes, see compact_table (default: False)
+
+        Returns: Iterable dataset indexed by years
         """
-        if 2012 > year or year > 2022:
-                raise IndexError(f'No data for requested year: {year}.\nNote: There is no official data before 2012 for this table')
-        ypath = os.path.join(self.root_dir,str(year))
-        for file in os.listdir(ypath):
-            fpath = os.path.join(ypath,file)
-            # load different types of tables
-            if any(desi in file for desi in ['BU-T01','BU-F-01','STD-F-01']):#
-                return self.load_BU01_2016_2022(fpath)
-            elif 'tb01_FaelleGrundtabelle_excel' in file:
-                return self.load_BU01_2012_2015(fpath)
-    
+        super().__init__(root_dir, use_cache, cache_dir, columns, compact)
+
     def load_BU01_2016_2022(self, fpath:str):
         """Method for loading T01 tables with the format given between 2016 and 2022
 
@@ -220,27 +469,7 @@ class T01DataLoader(object):
         Returns:
             T01 table (DataFrame): T01 table for the given year
         """
-        df = pd.read_excel(fpath,skiprows=3,thousands=',',decimal='.')
-        df = df.rename(columns={
-                'erfasste Fälle':'Anzahl erfasste Fälle',
-                'erfasste Fälle davon:\nVersuche':'erfasste Fälle: Anzahl Versuche',
-                'von Spalte 3\nVersuche':'erfasste Fälle: Anzahl Versuche',
-                'Unnamed: 5':'erfasste Fälle: Versuche in %',
-                'Tatortverteilung':'Tatortverteilung: bis unter 20.000 Einwohner',
-                'Unnamed: 7':'Tatortverteilung: 20.000 bis unter 100.000',
-                'Unnamed: 8':'Tatortverteilung: 100.000 bis unter 500.000',
-                'Unnamed: 9':'Tatortveteilung: 500.000 und mehr',
-                'Unnamed: 10':'Tatortverteilung: unbekannt',
-                'mit Schusswaffe':'mit Schusswaffe: gedroht',
-                'Unnamed: 12':'mit Schusswaffe: geschossen',
-                'Aufklärung':'Aufklärung: Anzahl Fälle',
-                'Unnamed: 14':'Aufklärung: in % (AQ)',
-                'Tatverdächtige':'Tatverdächtige: insgesamt',
-                'Unnamed: 16':'Tatverdächtige: männlich',
-                'Unnamed: 17':'Tatverdächtige: weiblich',
-                'Nichtdeutsche Tatverdächtige':'Nichtdeutsche Tatverdächtige: Anzahl',
-                'Unnamed: 19':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'})
-        return df.drop(range(4)).reset_index(drop=True)
+        return read_table(fpath, get_schema(self.table, 2016))
 
     def load_BU01_2012_2015(self, fpath:str):
         """Method for loading T01 tables with the format given between 2012 and 2015
@@ -251,82 +480,29 @@ class T01DataLoader(object):
         Returns:
             T01 table (DataFrame): T01 table for the given year
         """
-        df = pd.read_excel(fpath,skiprows=3,thousands=',',decimal='.')
-        df = df.rename(columns={
-                    'Schl.':'Schlüssel', # only applies to 2015
-                    'Schl.-':'Schlüssel',
-                    'Unnamed: 1':'Straftat',
-                    'erfasste Fälle':'Anzahl erfasste Fälle', # 2015
-                    'Unnamed: 2':'Anzahl erfasste Fälle',
-                    'Unnamed: 3':'%-Anteil an allen Fällen',
-                    'Unnamed: 4':'erfasste Fälle: Anzahl Versuche',
-                    'Unnamed: 5':'erfasste Fälle: Versuche in %',
-                    'Tatortverteilung':'Tatortverteilung: bis unter 20.000 Einwohner',
-                    'Unnamed: 7':'Tatortverteilung: 20.000 bis unter 100.000',
-                    'Unnamed: 8':'Tatortverteilung: 100.000 bis unter 500.000',
-                    'Unnamed: 9':'Tatortveteilung: 500.000 und mehr',
-                    'Unnamed: 10':'Tatortverteilung: unbekannt',
-                    'mit Schusswaffe':'mit Schusswaffe: gedroht',
-                    'Unnamed: 12':'mit Schusswaffe: geschossen',
-                    'Aufklärung':'Aufklärung: Anzahl Fälle',
-                    'Unnamed: 14':'Aufklärung: in % (AQ)',
-                    'Gesamtzahl':'Tatverdächtige: insgesamt',
-                    'von Spalte 16':'Tatverdächtige: männlich',
-                    'Unnamed: 17':'Tatverdächtige: weiblich',
-                    'Unnamed: 18':'Nichtdeutsche Tatverdächtige: Anzahl',
-                    'Unnamed: 19':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'})
-        return df.drop(range(4)).reset_index(drop=True)
-                
-class LKS01(object):
+        return read_table(fpath, get_schema(self.table, 2012))
+
+
+class LKS01(PKSDataLoader):
     """
         This is a class for loading the LKS (LA-F-01) tables
 
     """
-    def __init__(self,root_dir:str='../dat/PKS/'):
+    table = 'LKS01'
+
+    def __init__(self,root_dir:str='../dat/PKS/',use_cache:bool=True,cache_dir:str=None,columns:list=None,compact:bool=False):
         """Creates an object to load and format the base crime tables grouped by federal states for all available years in the root directory
 
         Params:
             root_dir (str): The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+            use_cache (bool): Whether normalized tables are cached on disk (default: True)
+            cache_dir (str): Directory of the on-disk cache (default: 'cache' directory next to root_dir)
+            columns (list): Normalized names of the columns to load (default: None, all columns)
+            compact (bool): Whether tables are converted to compact dtypes, see compact_table (default: False)
 
         Returns: Iterable dataset indexed by years
         """
-        self.root_dir = root_dir
-
-    def __len__(self):
-        """Returns the amount of files in the root_dir
-
-        Returns:
-            length (int): Amount of files in root_dir, capped at a maximum of 10
-        """
-        return min(len(os.listdir(self.root_dir)),10) # this table is missing in 2012, but the directory exists for other tables
-    
-    def __getitem__(self,year):
-        """Returns a Pandas DF with the respective LA-F-01 table of the given year.
-
-        Args:
-            year (int): Year for which DF is requested
-
-        Raises:
-            IndexError: When there is no data for the given year
-
-        Returns:
-            LKS table (DataFrame): DF with LA-F-01 data from the given year
-        """
-        if 2013 > year or year > 2022:
-                raise IndexError(f'No data for requested year: {year}.\nNote: There is no official data before 2013 for this table')
-        ypath = os.path.join(self.root_dir,str(year))
-        for file in os.listdir(ypath):
-            fpath = os.path.join(ypath,file)
-            # load table for all years
-            if any(desi in file for desi in ['LA','Laender']):
-                if 2019 <= year <= 2022:
-                    return self.load_LKS01_2019_2022(fpath)
-                if 2015 <= year <= 2018:
-                    return self.load_LKS01_2015_2018(fpath)
-                if year == 2014:
-                    return self.load_LKS01_2014(fpath)
-                if year == 2013:
-                    return self.load_LKS01_2013(fpath)
+        super().__init__(root_dir, use_cache, cache_dir, columns, compact)
 
     def load_LKS01_2019_2022(self, fpath:str):
         """Method for loading LA-F-01 tables with the format given between 2019 and 2022
@@ -337,30 +513,7 @@ class LKS01(object):
         Returns:
             LA-F-01 table (DataFrame): F01 table for the given year
         """
-        df = pd.read_excel(fpath,skiprows=3,thousands='.',decimal=',')
-        df = df.rename(columns={
-            'erfasste Fälle':'Anzahl erfasste Fälle', # 2019
-            'erfasste Fälle davon:\nVersuche':'erfasste Fälle: Anzahl Versuche',
-            'von Spalte 3\nVersuche':'erfasste Fälle: Anzahl Versuche', # 2019
-            'Unnamed: 6':'erfasste Fälle: Versuche in %',
-            'Tatortverteilung':'Tatortverteilung: bis unter 20.000 Einwohner',
-            'Unnamed: 8':'Tatortverteilung: 20.000 bis unter 100.000',
-            'Unnamed: 9':'Tatortverteilung: 100.000 bis unter 500.000',
-            'Unnamed: 10': 'Tatortverteilung: 500.000 und mehr',
-            'Unnamed: 11':'Tatortverteilung: unbekannt',
-            'mit Schusswaffe':'mit Schusswaffe: gedroht',
-            'Unnamed: 13':'mit Schusswaffe: geschossen',
-            'Aufklärung':'Aufklärung: Anzahl Fälle',
-            'Unnamed: 15':'Aufklärung: in % (AQ)',
-            'Tatverdächtige':'Tatverdächtige: insgesamt',
-            'Unnamed: 17':'Tatverdächtige: männlich',
-            'von Spalte 16':'Tatverdächtige: männlich',
-            'Unnamed: 18':'Tatverdächtige: weiblich',
-            'Nichtdeutsche Tatverdächtige':'Nichtdeutsche Tatverdächtige: Anzahl',
-            'Unnamed: 19':'Nichtdeutsche Tatverdächtige: Anzahl', # 2019
-            'Unnamed: 20':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'
-        })
-        return df.drop(range(4)).reset_index(drop=True)
+        return read_table(fpath, get_schema(self.table, 2019))
 
     def load_LKS01_2015_2018(self, fpath):
         """Method for loading LA-F-01 tables with the format given between 2015 and 2018
@@ -371,23 +524,7 @@ class LKS01(object):
         Returns:
             LA-F-01 table (DataFrame): F01 table for the given year
         """
-        # confirmed for 2018,2017,2016,2015
-        df = pd.read_excel(fpath,skiprows=4,thousands='.',decimal=',')
-        df = df.drop(['BL-Schl.','Sort'], axis=1, errors='ignore')
-        df = df.rename(columns={
-            'erfasste Fälle':'Anzahl erfasste Fälle',
-            'von Spalte 4 Versuche':'erfasste Fälle: Anzahl Versuche',
-            'Unnamed: 6':'erfasste Fälle: Versuche in %',
-            'Unnamed: 7':'erfasste Fälle: Versuche in %', # 2018
-            'Aufklärung':'Aufklärung: Anzahl Fälle',
-            'Unnamed: 8':'Aufklärung: in % (AQ)', # really the same?
-            'Unnamed: 9':'Aufklärung: in % (AQ)', # really the same?
-            'Tatver-dächtige insg.':'Tatverdächtige: insgesamt',
-            'Nichtdeutsche Tat-verdächtige':'Nichtdeutsche Tatverdächtige: Anzahl',
-            'Unnamed: 11':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %',
-            'Unnamed: 12':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %' # 2018
-        })
-        return df.drop(range(2)).reset_index(drop=True)
+        return read_table(fpath, get_schema(self.table, 2015))
 
     def load_LKS01_2014(self, fpath:str='../dat/PKS/2014/tb01_FaelleGrundtabelleLaender_excel.xlsx'):
         """Method for loading LA-F-01 tables with the format given for 2014
@@ -398,19 +535,7 @@ class LKS01(object):
         Returns:
             LA-F-01 table (DataFrame): F01 table for the given year
         """
-        df = pd.read_excel(fpath,skiprows=7,thousands='.',decimal=',')
-        df = df.rename(columns={
-            'Strft. Schl.':'Schlüssel',
-            'erfasste Fälle 2014':'Anzahl erfasste Fälle',
-            'Versuche absolut':'erfasste Fälle: Anzahl Versuche',
-            'Versuche in %':'erfasste Fälle: Versuche in %',
-            'aufgeklärte Fälle':'Aufklärung: Anzahl Fälle',
-            'AQ \nin %':'Aufklärung: in % (AQ)',
-            'TV insges.':'Tatverdächtige: insgesamt',
-            'NDTV insges.':'Nichtdeutsche Tatverdächtige: Anzahl',
-            'NDTV in %':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'
-        })
-        return df
+        return read_table(fpath, get_schema(self.table, 2014))
 
     def load_LKS01_2013(self, fpath:str='../dat/PKS/2013/tb01_FaelleGrundtabelleLaender_excel.xls'):
         """Method for loading LA-F-01 tables with the format given for 2013
@@ -421,19 +546,7 @@ class LKS01(object):
         Returns:
             LA-F-01 table (DataFrame): F01 table for the given year
         """
-        df = pd.read_excel(fpath,skiprows=8,thousands='.',decimal=',')
-        df = df.rename(columns={
-            'Strft. Schl.':'Schlüssel',
-            'erfasste Fälle 2013':'Anzahl erfasste Fälle',
-            'Versuche absolut':'erfasste Fälle: Anzahl Versuche',
-            'Versuche in %':'erfasste Fälle: Versuche in %',
-            'aufgeklärte Fälle':'Aufklärung: Anzahl Fälle',
-            'AQ \nin %':'Aufklärung: in % (AQ)',
-            'TV insges.':'Tatverdächtige: insgesamt',
-            'NDTV insges.':'Nichtdeutsche Tatverdächtige: Anzahl',
-            'NDTV in %':'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'
-        })
-        return df
+        return read_table(fpath, get_schema(self.table, 2013))
 
 
 # Unnecessary sanity checks for loading data and consistency checks
@@ -0,0 +1,288 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+from .DataCache import file_fingerprint, get_default_cache_dir
+from .DataLoaders import T01DataLoader, T08DataLoader, T20DataLoader, LKS01, LOADER_VERSION
+from .KeyHierarchy import TOTAL_KEY
+from .Schemas import FEDERAL_TERRITORY
+
+# Index levels of the panel, the values are stored in a Series named 'value'
+PANEL_INDEX = ['year', 'table', 'Bundesland', 'Schlüssel', 'metric']
+# Columns that identify or describe a row and therefore do not become metrics
+ID_COLUMNS = ['Schlüssel', 'Straftat', 'Bundesland', 'Sex', 'Schlüssel gültig von', 'Schlüssel gültig bis', 'Sort']
+
+# Files of the persisted panel in the cache directory, see update_panel
+PANEL_FILE = 'panel.pkl'
+PANEL_DERIVED_FILE = 'panel_derived.pkl'
+PANEL_MANIFEST_FILE = 'panel_manifest.json'
+
+PANEL_LOADERS = {'T01': T01DataLoader,
+                 'T08': T08DataLoader,
+                 'T20': T20DataLoader,
+                 'LKS01': LKS01}
+
+
+def table_to_long(df:pd.DataFrame, table:str, year:int) -> pd.DataFrame:
+    """Transforms a crime table to long format with one row per key, federal state and metric.
+       Non-numeric cells are dropped, T20 metrics are suffixed with the sex of the row (e.g. '0-13 (X)').
+
+    Args:
+        df (pd.DataFrame): Crime table as returned by the loaders
+        table (str): Table name (e.g. 'T01')
+        year (int): Year of the table
+
+    Returns:
+        long table (pd.DataFrame): DF with the columns year, table, Bundesland, Schlüssel, metric and value
+    """
+    df = df.copy()
+    if 'Bundesland' not in df.columns:
+        df['Bundesland'] = FEDERAL_TERRITORY
+    metrics = [col for col in df.columns if col not in ID_COLUMNS]
+    id_vars = ['Schlüssel', 'Bundesland'] + (['Sex'] if 'Sex' in df.columns else [])
+    long_df = df.melt(id_vars=id_vars, value_vars=metrics, var_name='metric', value_name='value')
+    long_df['value'] = pd.to_numeric(long_df['value'], errors='coerce')
+    long_df = long_df.dropna(subset=['value'])
+    if 'Sex' in long_df.columns:
+        long_df['metric'] = long_df['metric'].astype(str) + ' (' + long_df['Sex'].astype(str) + ')'
+        long_df = long_df.drop(columns='Sex')
+    long_df['metric'] = long_df['metric'].astype(str)
+    long_df['Schlüssel'] = long_df['Schlüssel'].astype(str)
+    long_df.insert(0, 'table', table)
+    long_df.insert(0, 'year', year)
+    return long_df[PANEL_INDEX + ['value']]
+
+
+def build_panel(root_dir:str='../dat/PKS/', years:range=range(2012, 2023), tables:list=None, duplicates:str='sum', workers:int=None,
+                metrics:list=None) -> pd.Series:
+    """Builds one long-format panel of the PKS tables of all given years.
+       The panel is a Series with a sorted MultiIndex (year, table, Bundesland, Schlüssel, metric), so slices
+       by key, year or metric are index lookups instead of boolean scans of every yearly table.
+
+    Args:
+        root_dir (str): The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+        years (range): Years to include, years for which a table has no data are skipped (default: 2012 - 2022)
+        tables (list): Names of the tables to include, see PANEL_LOADERS (default: None, all tables)
+        duplicates (str): How rows with the same key in one table are combined, 'sum' or 'first' (default: 'sum')
+        workers (int): Number of worker processes used to parse the tables (default: None, one per CPU)
+        metrics (list): Columns to include as metrics, only these columns are parsed (default: None, all columns)
+
+    Raises:
+        ValueError: If duplicates is neither 'sum' nor 'first'
+
+    Returns:
+        panel (pd.Series): Values indexed by year, table, Bundesland, Schlüssel and metric
+    """
+    if duplicates not in ['sum', 'first']:
+        raise ValueError(f"Unknown duplicate policy: {duplicates}. Use 'sum' or 'first'")
+    if tables is None:
+        tables = list(PANEL_LOADERS.keys())
+
+    columns = ID_COLUMNS + list(metrics) if metrics is not None else None
+    long_dfs = []
+    for table in tables:
+        long_dfs += _load_long_tables(PANEL_LOADERS[table](root_dir, columns=columns), years, workers)
+    return _long_to_panel(long_dfs, duplicates)
+
+
+def _load_long_tables(loader, years, workers:int=None) -> list:
+    """Loads the tables of the given years and transforms them to long format, years without the table are skipped
+    """
+    dfs, errors = loader.load_many(years, workers=workers)
+    for year, error in errors.items():
+        # IndexError: the table does not exist for this year
+        if not isinstance(error, IndexError):
+            raise Exception(f'Could not load {loader.table} table for {year}') from error
+    return [table_to_long(df, loader.table, year) for year, df in dfs.items()]
+
+
+def _long_to_panel(long_dfs:list, duplicates:str) -> pd.Series:
+    """Combines long tables to a panel with a sorted MultiIndex and categorical levels
+    """
+    long_df = pd.concat(long_dfs, ignore_index=True)
+    for level in ['table', 'Bundesland', 'Schlüssel', 'metric']:
+        long_df[level] = long_df[level].astype(str).astype('category')
+    grouped = long_df.groupby(PANEL_INDEX, observed=True, sort=True)['value']
+    panel = grouped.sum() if duplicates == 'sum' else grouped.first()
+    return panel
+
+
+def get_panel_slice(panel:pd.Series, key=None, metric=None, table=None, years=None, bundesland=None) -> pd.Series:
+    """Returns a slice of the panel. Each argument can be a single value or a list of values, None selects all.
+
+    Args:
+        panel (pd.Series): Panel created by build_panel
+        key: Crime key(s) (default: None)
+        metric: Metric(s), e.g. 'Anzahl erfasste Fälle' (default: None)
+        table: Table name(s) (default: None)
+        years: Year(s) (default: None)
+        bundesland: Federal state(s), FEDERAL_TERRITORY for federal values (default: None)
+
+    Returns:
+        slice (pd.Series): Values of the panel matching all given arguments
+    """
+    def _sel(value):
+        if value is None:
+            return slice(None)
+        if isinstance(value, (list, tuple, range, pd.Index)):
+            return list(value)
+        return [value]
+    return panel.loc[(_sel(years), _sel(table), _sel(bundesland), _sel(key), _sel(metric))]
+
+
+def _population_index(index:pd.MultiIndex, population:pd.Series) -> pd.Index:
+    """Returns the labels of the population for every row of the panel index: the federal state or year and federal state
+    """
+    bundesland = index.get_level_values('Bundesland').astype(str)
+    if population.index.nlevels == 1:
+        return bundesland
+    return pd.MultiIndex.from_arrays([index.get_level_values('year'), bundesland])
+
+
+def compute_derived(panel:pd.Series, years=None, population:pd.Series=None, per:float=1e5) -> pd.DataFrame:
+    """Computes the derived series of the panel: the change to the previous year (yoy, yoy_pct in %), the share of
+       the value of all crimes ('------') of the same year, table, federal state and metric (share in %) and, if the
+       population is given, the rate per `per` inhabitants. Shares and rates are only meaningful for counts.
+
+    Args:
+        panel (pd.Series): Panel created by build_panel
+        years: Only compute the rows of these years, the previous years are still used for yoy (default: None, all years)
+        population (pd.Series): Inhabitants indexed by Bundesland (the same for all years) or by year and Bundesland,
+                                FEDERAL_TERRITORY for federal values (default: None, no rates)
+        per (float): Number of inhabitants of the rate (default: 1e5)
+
+    Returns:
+        derived (pd.DataFrame): Columns value, yoy, yoy_pct, share (and rate), indexed like the panel
+    """
+    year_values = panel.index.get_level_values('year')
+    if years is not None:
+        years = set(years)
+        panel = panel[year_values.isin(years | set(year - 1 for year in years))]
+        year_values = panel.index.get_level_values('year')
+
+    derived = panel.to_frame('value')
+    previous = panel.copy()
+    previous.index = previous.index.set_levels(previous.index.levels[0] + 1, level='year')
+    previous = previous.reindex(panel.index).to_numpy()
+    derived['yoy'] = derived['value'].to_numpy() - previous
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derived['yoy_pct'] = derived['yoy'].to_numpy() / previous * 100
+
+    totals = panel.xs(TOTAL_KEY, level='Schlüssel')
+    totals = totals.reindex(panel.index.droplevel('Schlüssel')).to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derived['share'] = derived['value'].to_numpy() / totals * 100
+        if population is not None:
+            inhabitants = population.reindex(_population_index(panel.index, population)).to_numpy(dtype=float)
+            derived['rate'] = derived['value'].to_numpy() / inhabitants * per
+
+    if years is not None:
+        derived = derived[year_values.isin(years)]
+    return derived.replace([np.inf, -np.inf], np.nan)
+
+
+def _write_pickle(obj, path:str):
+    # write to a temporary file first so that concurrent readers never see a partial file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    pd.to_pickle(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def update_panel(root_dir:str='../dat/PKS/', tables:list=None, duplicates:str='sum', workers:int=None,
+                 cache_dir:str=None, population:pd.Series=None):
+    """Updates the panel and its derived series persisted in the cache directory. A manifest stores the fingerprint
+       of every source file, only new or changed tables are parsed and replaced in the panel. The derived series are
+       recomputed for the changed years and the years following them (yoy). Dropping a new year into root_dir and
+       calling this function again only processes the new year.
+
+    Args:
+        root_dir (str): The root directory containing the yearly directories of tables (default: '../dat/PKS/')
+        tables (list): Names of the tables to include, see PANEL_LOADERS (default: None, all tables)
+        duplicates (str): How rows with the same key in one table are combined, 'sum' or 'first' (default: 'sum')
+        workers (int): Number of worker processes used to parse the tables (default: None, one per CPU)
+        cache_dir (str): Directory of the persisted panel (default: None, 'cache' directory next to root_dir)
+        population (pd.Series): Inhabitants indexed by Bundesland, see compute_derived (default: None, no rates)
+
+    Raises:
+        ValueError: If duplicates is neither 'sum' nor 'first'
+
+    Returns:
+        panel (pd.Series): Panel of all years, see build_panel
+        derived (pd.DataFrame): Derived series, see compute_derived
+        changes (dict): (table, year) pairs that were 'added', 'updated' or 'removed'
+    """
+    if duplicates not in ['sum', 'first']:
+        raise ValueError(f"Unknown duplicate policy: {duplicates}. Use 'sum' or 'first'")
+    tables = sorted(tables if tables is not None else PANEL_LOADERS.keys())
+    cache_dir = cache_dir if cache_dir is not None else get_default_cache_dir(root_dir)
+    manifest_path = os.path.join(cache_dir, PANEL_MANIFEST_FILE)
+    panel_path = os.path.join(cache_dir, PANEL_FILE)
+    derived_path = os.path.join(cache_dir, PANEL_DERIVED_FILE)
+    population_hash = None if population is None else str(pd.util.hash_pandas_object(population).sum())
+
+    settings = {'tables': tables, 'duplicates': duplicates}
+    manifest = {'settings': settings, 'population': None, 'files': {}}
+    panel = derived = None
+    if os.path.exists(manifest_path) and os.path.exists(panel_path) and os.path.exists(derived_path):
+        with open(manifest_path) as f:
+            stored = json.load(f)
+        if stored.get('settings') == settings:
+            manifest = stored
+            panel = pd.read_pickle(panel_path)
+            derived = pd.read_pickle(derived_path)
+
+    loaders = {table: PANEL_LOADERS[table](root_dir) for table in tables}
+    files = dict()
+    for table, loader in loaders.items():
+        for year in loader.available_years():
+            fpath, _ = loader.get_file(year)
+            files[f'{table}/{year}'] = file_fingerprint(fpath, LOADER_VERSION)
+    old_files = manifest['files']
+    changes = {'added': [], 'updated': [], 'removed': []}
+    for entry, fingerprint in files.items():
+        if entry not in old_files:
+            changes['added'].append(entry)
+        elif old_files[entry] != fingerprint:
+            changes['updated'].append(entry)
+    changes['removed'] = [entry for entry in old_files if entry not in files]
+    changes = {kind: [(entry.split('/')[0], int(entry.split('/')[1])) for entry in sorted(entries)]
+               for kind, entries in changes.items()}
+    changed = changes['added'] + changes['updated'] + changes['removed']
+    if panel is not None and len(changed) == 0 and manifest['population'] == population_hash:
+        return panel, derived, changes
+
+    # parse only the new and changed tables and replace their rows in the panel
+    long_dfs = []
+    for table in tables:
+        years = [year for t, year in changes['added'] + changes['updated'] if t == table]
+        if len(years) > 0:
+            long_dfs += _load_long_tables(loaders[table], years, workers)
+    if panel is not None and len(panel) > 0:
+        table_years = pd.MultiIndex.from_arrays([panel.index.get_level_values('table').astype(str),
+                                                 panel.index.get_level_values('year')])
+        keep = ~table_years.isin(changed)
+        long_dfs.insert(0, panel[keep].reset_index())
+    panel = _long_to_panel(long_dfs, duplicates) if len(long_dfs) > 0 else pd.Series(dtype=float, name='value')
+
+    # recompute the derived series of the changed years and the years following them
+    panel_years = set(panel.index.get_level_values('year')) if len(panel) > 0 else set()
+    if derived is None or manifest['population'] != population_hash:
+        affected = panel_years
+        derived = None
+    else:
+        changed_years = set(year for _, year in changed)
+        affected = (changed_years | set(year + 1 for year in changed_years)) & panel_years
+        derived = derived[~derived.index.get_level_values('year').isin(changed_years | affected)]
+    if len(affected) > 0:
+        new_derived = compute_derived(panel, affected, population)
+        derived = new_derived if derived is None else pd.concat([derived, new_derived])
+        derived = derived.sort_index()
+    elif derived is None:
+        derived = pd.DataFrame(columns=['value', 'yoy', 'yoy_pct', 'share'])
+
+    os.makedirs(cache_dir, exist_ok=True)
+    _write_pickle(panel, panel_path)
+    _write_pickle(derived, derived_path)
+    with open(manifest_path, 'w') as f:
+        json.dump({'settings': settings, 'population': population_hash, 'files': files}, f, indent=2)
+    return panel, derived, changes
@@ -0,0 +1,264 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from .DataCache import file_fingerprint, get_default_cache_dir
+
+# Shapefile of all postal code areas with the codes and names of their Kreis and federal state
+GEO_SHAPEFILE = '../dat/PLZ/georef-germany-postleitzahl/georef-germany-postleitzahl.shp'
+# Bump when the way the region geometry is built changes, so that cached files are rebuilt
+GEO_VERSION = 1
+# Projection of the cached geometry (same as the maps of the spatial notebook)
+GEO_CRS = 'EPSG:3857'
+
+# Region levels -> columns of the shapefile kept per region, the first one identifies the region
+REGION_LEVELS = {'Bundesland': ['lan_name'],
+                 'Kreis': ['krs_code', 'krs_name', 'lan_name']}
+# Names of the shapefile columns in the cached geometry
+REGION_COLUMNS = {'lan_name': 'Bundesland',
+                  'krs_code': 'Kreis',
+                  'krs_name': 'Kreisname'}
+# Simplification tolerances in meters, 'full' keeps the dissolved geometry
+TOLERANCES = {'full': 0,
+              'fine': 250,
+              'medium': 1000,
+              'coarse': 5000}
+
+# Loaded region geometry of this process: (path, level, tolerance) -> GeoDataFrame
+_geometry_memo = dict()
+
+
+def get_default_geo_cache_dir(shapefile:str=GEO_SHAPEFILE) -> str:
+    """Returns the directory of the cached region geometry (e.g. '../dat/PLZ/<name>/<name>.shp' -> '../dat/cache/geo')
+    """
+    return os.path.join(get_default_cache_dir(os.path.dirname(os.path.dirname(os.path.abspath(shapefile)))), 'geo')
+
+
+def simplify_coverage(geometry:gpd.GeoSeries, tolerance:float) -> gpd.GeoSeries:
+    """Simplifies adjacent regions together, so that shared borders stay identical and no gaps or overlaps appear.
+       Falls back to simplifying every region on its own (topology preserving per region) for shapely < 2.1.
+
+    Args:
+        geometry (gpd.GeoSeries): Polygons of non-overlapping regions
+        tolerance (float): Simplification tolerance in units of the CRS, 0 returns the geometry unchanged
+
+    Returns:
+        geometry (gpd.GeoSeries): Simplified polygons
+    """
+    if tolerance == 0:
+        return geometry
+    if hasattr(shapely, 'coverage_simplify'):
+        simplified = shapely.coverage_simplify(np.asarray(geometry.values), tolerance)
+        return gpd.GeoSeries(simplified, index=geometry.index, crs=geometry.crs)
+    return geometry.simplify(tolerance, preserve_topology=True)
+
+
+def dissolve_regions(plz_geo:gpd.GeoDataFrame, level:str) -> gpd.GeoDataFrame:
+    """Merges the postal code areas into one (Multi)Polygon per region
+
+    Args:
+        plz_geo (gpd.GeoDataFrame): Postal code areas as read from GEO_SHAPEFILE
+        level (str): Region level, see REGION_LEVELS
+
+    Returns:
+        regions (gpd.GeoDataFrame): One row per region with the region column, descriptive columns and geometry
+    """
+    columns = [col for col in REGION_LEVELS[level] if col in plz_geo.columns]
+    regions = plz_geo[columns + ['geometry']].dissolve(by=columns[0], aggfunc='first', as_index=False)
+    regions['geometry'] = shapely.make_valid(np.asarray(regions.geometry.values))
+    regions = regions.rename(columns=REGION_COLUMNS)
+    return regions.sort_values(level).reset_index(drop=True)
+
+
+def build_region_geometry(shapefile:str=GEO_SHAPEFILE, cache_dir:str=None, levels:list=None, tolerances:dict=None) -> dict:
+    """Builds the cached region geometry: the postal code areas are dissolved per region, projected to GEO_CRS and
+       simplified at every tolerance. Each level is stored in one GeoPackage with one layer per tolerance, named
+       after the fingerprint of the shapefile, so a changed shapefile results in a rebuild.
+
+    Args:
+        shapefile (str): Shapefile of the postal code areas (default: GEO_SHAPEFILE)
+        cache_dir (str): Directory of the cached geometry (default: None, see get_default_geo_cache_dir)
+        levels (list): Region levels to build (default: None, all levels of REGION_LEVELS)
+        tolerances (dict): Tolerance name -> tolerance in meters (default: None, TOLERANCES)
+
+    Returns:
+        paths (dict): Level -> path of the GeoPackage
+    """
+    cache_dir = cache_dir or get_default_geo_cache_dir(shapefile)
+    levels = levels or list(REGION_LEVELS.keys())
+    tolerances = tolerances or TOLERANCES
+    fingerprint = file_fingerprint(shapefile, GEO_VERSION)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    plz_geo = gpd.read_file(shapefile).to_crs(GEO_CRS)
+    paths = dict()
+    for level in levels:
+        regions = dissolve_regions(plz_geo, level)
+        path = os.path.join(cache_dir, f'{level}_{fingerprint}.gpkg')
+        # write to a temporary file first so that concurrent readers never see a partial file
+        tmp_path = os.path.join(cache_dir, f'{level}_{fingerprint}.{os.getpid()}.tmp.gpkg')
+        for name, tolerance in tolerances.items():
+            simplified = regions.copy()
+            simplified['geometry'] = simplify_coverage(regions.geometry, tolerance)
+            simplified.to_file(tmp_path, layer=name, driver='GPKG')
+        os.replace(tmp_path, path)
+        for file in os.listdir(cache_dir):
+            if file.startswith(f'{level}_') and file.endswith('.gpkg') and file != os.path.basename(path):
+                os.remove(os.path.join(cache_dir, file))
+        paths[level] = path
+    return paths
+
+
+def _find_cached_geometry(shapefile:str, cache_dir:str, level:str):
+    """Returns the path of the cached geometry of a level or None. Without the shapefile the newest cached file is used.
+    """
+    if os.path.exists(shapefile):
+        path = os.path.join(cache_dir, f'{level}_{file_fingerprint(shapefile, GEO_VERSION)}.gpkg')
+        return path if os.path.exists(path) else None
+    if not os.path.isdir(cache_dir):
+        return None
+    files = [os.path.join(cache_dir, file) for file in os.listdir(cache_dir)
+             if file.startswith(f'{level}_') and file.endswith('.gpkg') and '.tmp' not in file]
+    return max(files, key=os.path.getmtime) if files else None
+
+
+def load_region_geometry(level:str='Bundesland', tolerance:str='medium', shapefile:str=GEO_SHAPEFILE, cache_dir:str=None) -> gpd.GeoDataFrame:
+    """Returns the simplified geometry of all regions of a level. The geometry is built once (see build_region_geometry)
+       and kept in memory afterwards, so only the first call of a session reads the cached file.
+
+    Args:
+        level (str): Region level, see REGION_LEVELS (default: 'Bundesland')
+        tolerance (str): Name of the simplification tolerance, see TOLERANCES (default: 'medium')
+        shapefile (str): Shapefile of the postal code areas (default: GEO_SHAPEFILE)
+        cache_dir (str): Directory of the cached geometry (default: None, see get_default_geo_cache_dir)
+
+    Raises:
+        ValueError: If the level is not in REGION_LEVELS
+        FileNotFoundError: If there is neither cached geometry nor the shapefile to build it from
+
+    Returns:
+        regions (gpd.GeoDataFrame): One row per region in GEO_CRS
+    """
+    if level not in REGION_LEVELS:
+        raise ValueError(f'Unknown region level: {level}. Use one of {list(REGION_LEVELS.keys())}')
+    cache_dir = cache_dir or get_default_geo_cache_dir(shapefile)
+    path = _find_cached_geometry(shapefile, cache_dir, level)
+    if path is None:
+        if not os.path.exists(shapefile):
+            raise FileNotFoundError(f'No cached geometry in {cache_dir} and the shapefile {shapefile} could not be found')
+        path = build_region_geometry(shapefile, cache_dir, levels=[level])[level]
+
+    key = (path, level, tolerance)
+    if key not in _geometry_memo:
+        _geometry_memo[key] = gpd.read_file(path, layer=tolerance)
+    return _geometry_memo[key].copy()
+
+
+class RegionIndex(object):
+    """
+        This is a class for assigning points (e.g. geocoded incidents) to the regions containing them.
+        The polygon parts of all regions are stored in an STRtree and prepared, so each point is only tested against
+        the few parts whose bounding box contains it, using the indexed point-in-polygon test of GEOS.
+    """
+    def __init__(self, regions:gpd.GeoDataFrame, column:str):
+        """Creates the spatial index of the given regions
+
+        Params:
+            regions (gpd.GeoDataFrame): Non-overlapping regions with a CRS (e.g. from load_region_geometry or
+                                        the PLZ shapefile)
+            column (str): Column with the region names (e.g. 'Bundesland' or 'plz')
+        """
+        if regions.crs is None:
+            raise ValueError('The regions need a CRS to transform the points to')
+        self.crs = regions.crs
+        self.names = pd.Index(regions[column].to_numpy(), name=column)
+        # multipolygons are split into their parts, so the tree holds tight bounding boxes (e.g. islands)
+        parts = regions.geometry.reset_index(drop=True).explode(index_parts=False)
+        self._parts = np.asarray(parts.values)
+        self._part_region = parts.index.to_numpy(dtype=np.int32)
+        shapely.prepare(self._parts)
+        self._tree = shapely.STRtree(self._parts)
+        self._transformer = None
+        if not self.crs.equals('EPSG:4326'):
+            from pyproj import Transformer
+            self._transformer = Transformer.from_crs('EPSG:4326', self.crs, always_xy=True)
+
+    @classmethod
+    def from_level(cls, level:str='Bundesland', tolerance:str='full', **kwargs):
+        """Creates the index of the cached region geometry of a level (see load_region_geometry)
+
+        Args:
+            level (str): Region level, see REGION_LEVELS (default: 'Bundesland')
+            tolerance (str): Name of the simplification tolerance, see TOLERANCES (default: 'full')
+            **kwargs: Further arguments of load_region_geometry
+
+        Returns:
+            index (RegionIndex): Index of the regions
+        """
+        return cls(load_region_geometry(level, tolerance, **kwargs), level)
+
+    def _assign_chunk(self, lat:np.ndarray, lon:np.ndarray) -> np.ndarray:
+        if self._transformer is not None:
+            x, y = self._transformer.transform(lon, lat)
+        else:
+            x, y = lon, lat
+        points = shapely.points(x, y)
+        point_idx, part_idx = self._tree.query(points, predicate='intersects')
+        codes = np.full(len(points), -1, dtype=np.int32)
+        # points on a shared border intersect several regions, the first one in the regions table wins
+        codes[point_idx[::-1]] = self._part_region[part_idx[::-1]]
+        return codes
+
+    def assign(self, lat, lon, chunk_size:int=500000, return_stats:bool=False):
+        """Assigns points given in WGS84 coordinates to regions. The points are processed in chunks, so the memory
+           used for the temporary geometries is bounded by chunk_size.
+
+        Args:
+            lat: Latitudes (array-like)
+            lon: Longitudes (array-like)
+            chunk_size (int): Number of points processed at once (default: 500,000)
+            return_stats (bool): Whether throughput statistics are returned as well (default: False)
+
+        Returns:
+            codes (np.ndarray): Position of the region of each point in self.names, -1 for points outside all regions
+            stats (dict): points, assigned points, seconds and points per second (only if return_stats is True)
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        if lat.shape != lon.shape:
+            raise ValueError('lat and lon must have the same length')
+        start = time.perf_counter()
+        codes = np.empty(len(lat), dtype=np.int32)
+        for i in range(0, len(lat), chunk_size):
+            codes[i:i + chunk_size] = self._assign_chunk(lat[i:i + chunk_size], lon[i:i + chunk_size])
+        if not return_stats:
+            return codes
+        seconds = time.perf_counter() - start
+        stats = {'points': len(codes),
+                 'assigned': int((codes >= 0).sum()),
+                 'seconds': seconds,
+                 'points_per_second': len(codes) / seconds if seconds > 0 else float('inf')}
+        return codes, stats
+
+    def assign_names(self, lat, lon, chunk_size:int=500000) -> pd.Categorical:
+        """Assigns points given in WGS84 coordinates to regions and returns the region names
+
+        Args:
+            lat: Latitudes (array-like)
+            lon: Longitudes (array-like)
+            chunk_size (int): Number of points processed at once (default: 500,000)
+
+        Returns:
+            regions (pd.Categorical): Name of the region of each point, NaN for points outside all regions
+        """
+        codes = self.assign(lat, lon, chunk_size)
+        name_codes, categories = pd.factorize(self.names)
+        return pd.Categorical.from_codes(np.where(codes >= 0, name_codes[codes], -1), categories=categories)
+
+if __name__ == '__main__':
+    # build step: python -m src.GeoFunctions [shapefile]
+    import sys
+    for level, path in build_region_geometry(*sys.argv[1:2]).items():
+        print(f'{level}: {path}')
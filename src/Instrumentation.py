@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import defaultdict
+
+# Instrumentation is opt-in: while disabled, stage() returns a shared no-op object and instrumented functions
+# are called directly, so the overhead is one global lookup per call
+_enabled = False
+_deep_bytes = False
+_lock = threading.Lock()
+_local = threading.local()
+_events = []
+_counters = defaultdict(int)
+_origin = time.perf_counter()
+
+
+def enable(deep_bytes:bool=False, reset:bool=True):
+    """Starts recording stages and counters
+
+    Args:
+        deep_bytes (bool): Whether the memory of object columns is measured exactly (slower), see DataFrame.memory_usage (default: False)
+        reset (bool): Whether previously recorded stages and counters are removed (default: True)
+    """
+    global _enabled, _deep_bytes
+    if reset:
+        clear()
+    _deep_bytes = deep_bytes
+    _enabled = True
+
+
+def disable():
+    """Stops recording, the recorded stages are kept until clear() or the next enable()
+    """
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    """Returns whether instrumentation is active
+    """
+    return _enabled
+
+
+def clear():
+    """Removes all recorded stages and counters
+    """
+    global _origin
+    with _lock:
+        _events.clear()
+        _counters.clear()
+        _origin = time.perf_counter()
+
+
+def _measure(obj) -> tuple:
+    """Returns the rows and bytes of a result (DataFrame, Series, ndarray or sequence) or (None, None)
+    """
+    if isinstance(obj, tuple):
+        # e.g. (years, cases) -> measure the largest element
+        measured = [_measure(item) for item in obj]
+        measured = [m for m in measured if m[1] is not None]
+        return max(measured, key=lambda m: m[1]) if measured else (None, None)
+    if hasattr(obj, 'memory_usage') and hasattr(obj, 'shape'):
+        usage = obj.memory_usage(index=True, deep=_deep_bytes)
+        return obj.shape[0], int(usage.sum() if hasattr(usage, 'sum') else usage)
+    if hasattr(obj, 'nbytes') and hasattr(obj, 'shape'):
+        return (obj.shape[0] if len(obj.shape) > 0 else 1), int(obj.nbytes)
+    if isinstance(obj, list):
+        return len(obj), None
+    return None, None
+
+
+class _NullStage(object):
+    """Stage used while instrumentation is disabled, all methods do nothing
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def record(self, obj=None, **meta):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage(object):
+    """
+        This is a class measuring the wall time of a block, with optional rows, bytes and further attributes
+    """
+    def __init__(self, name:str, meta:dict):
+        self.name = name
+        self.meta = meta
+        self.rows = None
+        self.bytes = None
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.parent = stack[-1].name if stack else None
+        self.depth = len(stack)
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def record(self, obj=None, **meta):
+        """Records the size of a result and further attributes (e.g. cache='disk') of the stage
+
+        Args:
+            obj: DataFrame, Series, ndarray or sequence whose rows and bytes are recorded (default: None)
+            **meta: Further attributes stored with the stage
+        """
+        if obj is not None:
+            self.rows, self.bytes = _measure(obj)
+        self.meta.update(meta)
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        _local.stack.pop()
+        event = {'name': self.name,
+                 'start': self.start - _origin,
+                 'duration': end - self.start,
+                 'rows': self.rows,
+                 'bytes': self.bytes,
+                 'depth': self.depth,
+                 'parent': self.parent,
+                 'pid': os.getpid(),
+                 'tid': threading.get_ident(),
+                 'error': exc_type.__name__ if exc_type is not None else None}
+        event.update(self.meta)
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def stage(name:str, **meta):
+    """Context manager measuring a stage, e.g. `with stage('read_excel', year=2022) as st: df = ...; st.record(df)`
+
+    Args:
+        name (str): Name of the stage
+        **meta: Attributes stored with the stage (e.g. table, year)
+
+    Returns:
+        stage (Stage): Recording stage, or a no-op stage while instrumentation is disabled
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return Stage(name, meta)
+
+
+def instrument(name:str=None):
+    """Decorator measuring every call of a function as a stage, the rows and bytes of the result are recorded
+
+    Args:
+        name (str): Name of the stage (default: None, qualified name of the function)
+    """
+    def decorator(fn):
+        stage_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Stage(stage_name, {}) as st:
+                result = fn(*args, **kwargs)
+                st.record(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def count(name:str, value:int=1):
+    """Increments a counter (e.g. cache hits) while instrumentation is enabled
+
+    Args:
+        name (str): Name of the counter, e.g. 'cache.memory.hit'
+        value (int): Increment (default: 1)
+    """
+    if _enabled:
+        with _lock:
+            _counters[name] += value
+
+
+def get_events() -> list:
+    """Returns a copy of the recorded stages (times in seconds since enable()/clear())
+    """
+    with _lock:
+        return [dict(event) for event in _events]
+
+
+def get_counters() -> dict:
+    """Returns a copy of the counters
+    """
+    with _lock:
+        return dict(_counters)
+
+
+def summary() -> dict:
+    """Aggregates the recorded stages by name
+
+    Returns:
+        summary (dict): Per stage name: calls, total/mean/max seconds, total rows and bytes
+    """
+    stats = dict()
+    for event in get_events():
+        entry = stats.setdefault(event['name'], {'calls': 0, 'total': 0.0, 'max': 0.0, 'rows': 0, 'bytes': 0})
+        entry['calls'] += 1
+        entry['total'] += event['duration']
+        entry['max'] = max(entry['max'], event['duration'])
+        entry['rows'] += event['rows'] or 0
+        entry['bytes'] += event['bytes'] or 0
+    for entry in stats.values():
+        entry['mean'] = entry['total'] / entry['calls']
+    return dict(sorted(stats.items(), key=lambda item: item[1]['total'], reverse=True))
+
+
+def to_json(path:str=None) -> dict:
+    """Exports the recorded stages, counters and summary as JSON
+
+    Args:
+        path (str): File to write (default: None, only return the report)
+
+    Returns:
+        report (dict): Keys 'events', 'counters' and 'summary'
+    """
+    report = {'events': get_events(), 'counters': get_counters(), 'summary': summary()}
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    return report
+
+
+def to_chrome_trace(path:str=None) -> dict:
+    """Exports the recorded stages in the Chrome trace event format (open with chrome://tracing or Perfetto)
+
+    Args:
+        path (str): File to write (default: None, only return the trace)
+
+    Returns:
+        trace (dict): Trace with complete ('X') events in microseconds and the counters as metadata
+    """
+    trace_events = []
+    for event in get_events():
+        args = {key: value for key, value in event.items()
+                if key not in ('name', 'start', 'duration', 'pid', 'tid', 'depth', 'parent') and value is not None}
+        trace_events.append({'name': event['name'],
+                             'cat': event['name'].split('.')[0],
+                             'ph': 'X',
+                             'ts': event['start'] * 1e6,
+                             'dur': event['duration'] * 1e6,
+                             'pid': event['pid'],
+                             'tid': event['tid'],
+                             'args': args})
+    trace = {'traceEvents': trace_events, 'displayTimeUnit': 'ms', 'otherData': {'counters': get_counters()}}
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(trace, f, default=str)
+    return trace
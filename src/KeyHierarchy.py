@@ -0,0 +1,195 @@
+import pandas as pd
+
+# Key of the row containing all crimes
+TOTAL_KEY = '------'
+# Prefix of the summary keys (Summenschlüssel), which aggregate keys across the regular hierarchy
+SUMMARY_KEY_PREFIX = '89'
+
+# Keys that were replaced by another key: old key -> (new key, first year of the new key per table)
+KEY_MIGRATIONS = {'517500': ('897100', {'T01': 2016, 'T08': 2015, 'T20': 2016, 'LKS01': 2016})} # computer fraud
+
+
+def _significant(key:str) -> str:
+    """Returns the key without trailing zeros, but at least its first character (e.g. '510000' -> '51', '000000' -> '0')
+    """
+    return key.rstrip('0') or key[:1]
+
+
+class KeyHierarchy(object):
+    """
+        This is a class describing the hierarchy of the PKS crime keys. A key is a child of the most specific
+        existing key whose digits (without trailing zeros) are a prefix of it, e.g. '517500' -> '517000' -> '510000'
+        -> '500000' -> '------'. Keys with wildcards ('3**100') only have wildcard keys as parents ('3***00').
+        Wildcard keys and summary keys (89xxxx) aggregate across the regular hierarchy, so they form separate trees
+        that are not attached to '------'.
+    """
+    def __init__(self, keys):
+        """Builds the hierarchy of the given keys. Parents and children are stored in dicts, so lookups are O(1).
+
+        Params:
+            keys (iterable): Crime keys, e.g. the union of the keys of the tables of all years
+        """
+        self.keys = sorted(set(str(key) for key in keys))
+        key_set = set(self.keys)
+        self._parent = dict()
+        self._children = {key: list() for key in self.keys}
+        for key in self.keys:
+            if key == TOTAL_KEY:
+                continue
+            parent = self._find_parent(key, key_set)
+            self._parent[key] = parent
+            if parent is not None:
+                self._children[parent].append(key)
+
+        # keys ordered from the deepest level to the roots, used for bottom-up aggregation
+        self._bottom_up = sorted(self.keys, key=self.depth, reverse=True)
+
+    @classmethod
+    def from_tables(cls, tables):
+        """Builds the hierarchy of all keys occurring in the given tables
+
+        Args:
+            tables (iterable): Crime tables with a 'Schlüssel' column, e.g. the tables of all years
+
+        Returns:
+            hierarchy (KeyHierarchy): Hierarchy of the keys
+        """
+        keys = set()
+        for df in tables:
+            keys.update(df['Schlüssel'].astype(str).unique())
+        return cls(keys)
+
+    @staticmethod
+    def _find_parent(key:str, key_set:set):
+        sig = _significant(key)
+        wildcard = '*' in key
+        for length in range(len(sig) - 1, -1 if wildcard else 0, -1):
+            if wildcard:
+                candidate = (sig[:length] + '*' * (len(sig) - length)).ljust(len(key), '0')
+            else:
+                candidate = sig[:length].ljust(len(key), '0')
+            if candidate != key and candidate in key_set:
+                return candidate
+        if wildcard or key.startswith(SUMMARY_KEY_PREFIX) or TOTAL_KEY not in key_set:
+            return None
+        return TOTAL_KEY
+
+    def parent(self, key:str):
+        """Returns the parent of a key or None for the roots ('------' and the roots of the summary/wildcard trees)
+        """
+        return self._parent.get(key)
+
+    def children(self, key:str) -> list:
+        """Returns the direct children of a key
+        """
+        return list(self._children.get(key, []))
+
+    def ancestors(self, key:str) -> list:
+        """Returns all ancestors of a key, starting with its parent
+        """
+        ancestors = list()
+        parent = self.parent(key)
+        while parent is not None:
+            ancestors.append(parent)
+            parent = self.parent(parent)
+        return ancestors
+
+    def depth(self, key:str) -> int:
+        """Returns the number of ancestors of a key
+        """
+        return len(self.ancestors(key))
+
+    def descendants(self, key:str) -> list:
+        """Returns all keys of the subtree below a key (without the key itself)
+        """
+        descendants = list()
+        stack = list(self._children.get(key, []))
+        while stack:
+            child = stack.pop()
+            descendants.append(child)
+            stack.extend(self._children[child])
+        return sorted(descendants)
+
+    def leaves(self, key:str) -> list:
+        """Returns all keys without children in the subtree of a key (the key itself if it has no children)
+        """
+        subtree = [key] + self.descendants(key)
+        return [k for k in subtree if len(self._children.get(k, [])) == 0]
+
+    def rollup(self, df:pd.DataFrame, column:str) -> pd.Series:
+        """Aggregates a numeric column bottom-up for all keys: a key without children keeps its value, every other
+           key gets the sum of the aggregated values of its children. Rows with the same key are summed first.
+           Comparing the result with the reported values shows where the published sub-keys do not add up.
+
+        Args:
+            df (pd.DataFrame): Crime table with a 'Schlüssel' column (T20: select one 'Sex' first)
+            column (str): Numeric column to aggregate
+
+        Returns:
+            aggregated values (pd.Series): Values indexed by all keys of the hierarchy
+        """
+        values = pd.to_numeric(df[column], errors='coerce').groupby(df['Schlüssel'].astype(str)).sum()
+        totals = values.reindex(self.keys, fill_value=0).to_dict()
+        has_children = {key: len(children) > 0 for key, children in self._children.items()}
+        for key in self._bottom_up:
+            if has_children[key]:
+                totals[key] = sum(totals[child] for child in self._children[key])
+        return pd.Series(totals).reindex(self.keys)
+
+    def subtree_sum(self, df:pd.DataFrame, column:str, key:str, leaves_only:bool=True) -> float:
+        """Sums a numeric column over the subtree of a key
+
+        Args:
+            df (pd.DataFrame): Crime table with a 'Schlüssel' column (T20: select one 'Sex' first)
+            column (str): Numeric column to sum
+            key (str): Root of the subtree
+            leaves_only (bool): Whether only keys without children are summed, otherwise all keys of the subtree (default: True)
+
+        Returns:
+            sum (float): Sum over the subtree
+        """
+        keys = self.leaves(key) if leaves_only else [key] + self.descendants(key)
+        rows = df.loc[df['Schlüssel'].astype(str).isin(keys), column]
+        return pd.to_numeric(rows, errors='coerce').sum()
+
+
+def _key_migrations(year:int, table:str) -> dict:
+    """Returns the migrations of KEY_MIGRATIONS whose new key does not exist yet in the table of the given year
+    """
+    return {old_key: new_key for old_key, (new_key, first_years) in KEY_MIGRATIONS.items() if year < first_years[table]}
+
+
+def get_key_for_year(key:str, year:int, table:str) -> str:
+    """Returns the key under which a crime is recorded in a table of the given year: new keys of KEY_MIGRATIONS are
+       replaced by their predecessors for the years before the new key was introduced in that table, all other keys
+       are returned unchanged
+
+    Args:
+        key (str): Crime key, e.g. a key migrated by migrate_keys
+        year (int): Year of the table
+        table (str): Table name (e.g. 'T08'), the new keys were not introduced in the same year in all tables
+
+    Returns:
+        key (str): Key used in that year
+    """
+    mapping = {new_key: old_key for old_key, new_key in _key_migrations(year, table).items()}
+    return mapping.get(key, key)
+
+
+def migrate_keys(df:pd.DataFrame, year:int, table:str) -> pd.DataFrame:
+    """Replaces old keys of a table by their successors (see KEY_MIGRATIONS), so that time series can use the newest keys.
+       Old keys are kept if their successor already exists in the table, so that no key is counted twice.
+
+    Args:
+        df (pd.DataFrame): Crime table of a year
+        year (int): Year of the table
+        table (str): Table name (e.g. 'T08')
+
+    Returns:
+        table (pd.DataFrame): Copy of the table with migrated keys
+    """
+    keys = set(df['Schlüssel'].astype(str))
+    mapping = {old_key: new_key for old_key, new_key in _key_migrations(year, table).items() if new_key not in keys}
+    df = df.copy()
+    df['Schlüssel'] = df['Schlüssel'].astype(str).replace(mapping)
+    return df
@@ -0,0 +1,158 @@
+import numpy as np
+import pandas as pd
+from .DataLoaders import T20DataLoader
+from .Instrumentation import stage
+
+# Non-overlapping age bands of the T20 tables, every other band of the tables is a sum of these
+AGE_BANDS = ['0-5', '6-7', '8-9', '10-11', '12-13', '14-15', '16-17', '18-20', '21-22', '23-24', '25-29',
+             '30-39', '40-49', '50-59', '>60']
+# Overlapping bands of the T20 tables (and the total) as the age bands they consist of
+COMPOSITE_BANDS = {'Anzahl erfasste TV': AGE_BANDS,
+                   '0-13': ['0-5', '6-7', '8-9', '10-11', '12-13'],
+                   '14-17': ['14-15', '16-17'],
+                   '0-20': ['0-5', '6-7', '8-9', '10-11', '12-13', '14-15', '16-17', '18-20'],
+                   '21-24': ['21-22', '23-24'],
+                   '>21': ['21-22', '23-24', '25-29', '30-39', '40-49', '50-59', '>60']}
+# Sex of the offenders: male, female and both (X, the sum of M and W). The percentage rows of 2012 ('M %') are dropped
+SEXES = ['M', 'W', 'X']
+
+
+class OffenderTensor(object):
+    """
+        This is a class holding the suspects of the T20 tables of all years in one integer array of shape
+        (year, key, sex, age band), so that demographic slices of many keys are array indexing.
+        Only the non-overlapping AGE_BANDS are stored, the overlapping bands are summed with aggregation matrices.
+    """
+    def __init__(self, years:list, keys:list, cases:np.ndarray, present:np.ndarray, names:dict=None):
+        """Creates the tensor from its arrays, see from_loader
+
+        Params:
+            years (list): Years of the first axis
+            keys (list): Crime keys of the second axis
+            cases (np.ndarray): Suspects of shape (len(years), len(keys), len(SEXES), len(AGE_BANDS))
+            present (np.ndarray): Whether a key exists in the table of a year, shape (len(years), len(keys))
+            names (dict): Crime name by key (default: None)
+        """
+        self.years = list(years)
+        self.keys = np.asarray(keys, dtype=object)
+        self.cases = cases
+        self.present = present
+        self.names = names or dict()
+        self._year_index = {year: i for i, year in enumerate(self.years)}
+        self._key_index = {key: i for i, key in enumerate(self.keys)}
+        self._sex_index = {sex: i for i, sex in enumerate(SEXES)}
+        self._band_index = {band: i for i, band in enumerate(AGE_BANDS)}
+        self._matrices = dict()
+
+    @classmethod
+    def from_loader(cls, loader:T20DataLoader=None, years:range=range(2012, 2023)):
+        """Materializes the T20 tables of the given years. Rows with the same key and sex are summed,
+           keys missing in a year have 0 suspects (see present).
+
+        Args:
+            loader (T20DataLoader): Loader of the T20 tables (default: None, T20DataLoader())
+            years (range): Years of the tensor (default: range(2012, 2023))
+
+        Returns:
+            tensor (OffenderTensor): Suspects of all keys
+        """
+        loader = loader or T20DataLoader()
+        tables = []
+        for year in years:
+            df = loader[year]
+            df = df.loc[df['Sex'].isin(SEXES), ['Schlüssel', 'Straftat', 'Sex'] + AGE_BANDS]
+            df['Schlüssel'] = df['Schlüssel'].astype(str)
+            tables.append(df)
+
+        with stage('OffenderTensor.build', years=len(tables)) as st:
+            # newest name of every key, keys are sorted to make the lookup table stable between builds
+            names = pd.concat(tables[::-1]).drop_duplicates('Schlüssel').set_index('Schlüssel')['Straftat']
+            keys = np.sort(names.index.to_numpy().astype(str)).astype(object)
+            key_codes = pd.Index(keys)
+            cases = np.zeros((len(tables), len(keys), len(SEXES), len(AGE_BANDS)), dtype=np.int64)
+            present = np.zeros((len(tables), len(keys)), dtype=bool)
+            for i, df in enumerate(tables):
+                k = key_codes.get_indexer(df['Schlüssel'])
+                s = pd.Index(SEXES).get_indexer(df['Sex'])
+                # np.add.at sums rows with the same key and sex
+                np.add.at(cases[i], (k, s), df[AGE_BANDS].to_numpy(dtype=np.int64))
+                present[i, k] = True
+            if cases.max(initial=0) < np.iinfo(np.int32).max:
+                cases = cases.astype(np.int32)
+            st.record(cases)
+        return cls(list(years), keys, cases, present, names.to_dict())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def key_codes(self, keys) -> np.ndarray:
+        """Converts crime keys to their position on the key axis
+
+        Args:
+            keys: Crime key or keys
+
+        Raises:
+            KeyError: If a key does not exist in any year
+
+        Returns:
+            codes (np.ndarray): Position of each key
+        """
+        keys = [keys] if isinstance(keys, str) else keys
+        return np.array([self._key_index[key] for key in keys], dtype=np.int64)
+
+    def aggregation_matrix(self, bands:list) -> np.ndarray:
+        """Returns the 0/1 matrix of shape (len(AGE_BANDS), len(bands)) summing the age bands into the given bands
+
+        Args:
+            bands (list): Age bands of AGE_BANDS or COMPOSITE_BANDS, e.g. ['0-13', '14-17', '18-20', '>21']
+
+        Raises:
+            KeyError: If a band is unknown
+
+        Returns:
+            matrix (np.ndarray): Aggregation matrix, cached per combination of bands
+        """
+        bands = tuple(bands)
+        if bands not in self._matrices:
+            matrix = np.zeros((len(AGE_BANDS), len(bands)), dtype=self.cases.dtype)
+            for j, band in enumerate(bands):
+                parts = COMPOSITE_BANDS.get(band, [band])
+                matrix[[self._band_index[part] for part in parts], j] = 1
+            self._matrices[bands] = matrix
+        return self._matrices[bands]
+
+    def select(self, keys=None, sex:str='X', bands:list=None, years=None) -> np.ndarray:
+        """Returns the suspects of keys, one sex and the given age bands
+
+        Args:
+            keys: Crime key or keys (default: None, all keys)
+            sex (str): 'M', 'W' or 'X' for both (default: 'X')
+            bands (list): Age bands of AGE_BANDS or COMPOSITE_BANDS (default: None, AGE_BANDS)
+            years: Years (default: None, all years)
+
+        Returns:
+            cases (np.ndarray): Suspects of shape (len(years), len(keys), len(bands)), without the key axis
+                                if a single key is given as str
+        """
+        single_key = isinstance(keys, str)
+        cases = self.cases if years is None else self.cases[[self._year_index[year] for year in years]]
+        if keys is not None:
+            cases = cases[:, self.key_codes(keys)]
+        cases = cases[:, :, self._sex_index[sex]]
+        if bands is not None:
+            cases = cases @ self.aggregation_matrix(bands)
+        return cases[:, 0] if single_key else cases
+
+    def to_frame(self, key:str, sex:str='X', bands:list=None) -> pd.DataFrame:
+        """Returns the suspects of one key as a table
+
+        Args:
+            key (str): Crime key
+            sex (str): 'M', 'W' or 'X' for both (default: 'X')
+            bands (list): Age bands of AGE_BANDS or COMPOSITE_BANDS (default: None, AGE_BANDS)
+
+        Returns:
+            cases (pd.DataFrame): Suspects indexed by year with one column per band
+        """
+        bands = list(bands) if bands is not None else AGE_BANDS
+        return pd.DataFrame(self.select(key, sex, bands), index=pd.Index(self.years, name='Jahr'), columns=bands)
@@ -1,5 +1,5 @@
+import warnings
 import numpy as np
-import matplotlib.pyplot as plt
 
 # Spatial Exploration
 
@@ -50,16 +50,250 @@ def plot_cbar(ax,vmin,vmax,cmap,label=None):
         ax.set_ylabel(label)
         ax.yaxis.set_label_position("right")
 
+
+def geometry_to_paths(geometry) -> list:
+    """Converts (Multi)Polygons to matplotlib paths, one compound path with holes per geometry.
+       The paths can be reused by any number of collections, so the geometry is only converted once.
+
+    Args:
+        geometry: Iterable of shapely (Multi)Polygons, e.g. the geometry column of a GeoDataFrame
+
+    Returns:
+        paths (list): One matplotlib Path per geometry (empty path for empty geometries)
+    """
+    from matplotlib.path import Path
+    paths = []
+    for geom in geometry:
+        polygons = list(geom.geoms) if hasattr(geom, 'geoms') else [geom]
+        rings = [ring for polygon in polygons if not polygon.is_empty
+                 for ring in [polygon.exterior] + list(polygon.interiors)]
+        if len(rings) == 0:
+            paths.append(Path(np.empty((0, 2))))
+            continue
+        vertices = [np.asarray(ring.coords)[:, :2] for ring in rings]
+        codes = [np.full(len(v), Path.LINETO, dtype=Path.code_type) for v in vertices]
+        for c in codes:
+            c[0] = Path.MOVETO
+            c[-1] = Path.CLOSEPOLY
+        paths.append(Path(np.concatenate(vertices), np.concatenate(codes)))
+    return paths
+
+
+def _add_choropleth(ax, paths:list, values:np.ndarray, cmap, norm, edgecolor, linewidth):
+    """Adds a collection of the given paths colored by values to the axis
+    """
+    from matplotlib.collections import PathCollection
+    collection = PathCollection(paths, cmap=cmap, norm=norm, edgecolor=edgecolor, linewidth=linewidth)
+    collection.set_transform(ax.transData)
+    collection.set_array(np.ma.masked_invalid(values))
+    ax.add_collection(collection, autolim=False)
+    return collection
+
+
+def _choropleth_limits(paths:list) -> tuple:
+    """Returns the bounding box (xmin, xmax, ymin, ymax) of all paths
+    """
+    vertices = np.concatenate([path.vertices for path in paths if len(path.vertices) > 0])
+    return vertices[:, 0].min(), vertices[:, 0].max(), vertices[:, 1].min(), vertices[:, 1].max()
+
+
+def _prepare_choropleth(geo, values, column:str, cmap, vmin, vmax):
+    """Aligns the values with the regions of geo and creates the colormap and the shared normalization
+    """
+    import matplotlib as mpl
+    values = values.to_frame() if values.ndim == 1 else values
+    aligned = values.reindex(geo[column].to_numpy()).to_numpy(dtype=float) # rows: regions, columns: panels
+    vmin = np.nanmin(aligned) if vmin is None else vmin
+    vmax = np.nanmax(aligned) if vmax is None else vmax
+    cmap = mpl.colormaps[cmap].copy() if isinstance(cmap, str) else cmap.copy()
+    cmap.set_bad('lightgrey') # regions without a value
+    return aligned, cmap, mpl.colors.Normalize(vmin=vmin, vmax=vmax)
+
+
+def plot_choropleth_grid(geo, values, nrows:int, ncols:int, column:str='Bundesland', cmap='Oranges', vmin:float=None,
+                         vmax:float=None, cbar_label:str=None, edgecolor='black', linewidth:float=.1, figsize=None):
+    """Plots small multiples of choropleth maps with a shared color scale, e.g. one map per year.
+       The geometry is converted to paths once and every panel only gets its own face colors, instead of
+       calling GeoDataFrame.plot (and converting the geometry) for every panel.
+
+    Args:
+        geo (gpd.GeoDataFrame): Regions with the column identifying them and their geometry
+        values (pd.DataFrame): Values with one row per region (index: region, e.g. Bundesland) and one column per
+                               panel, the column names are used as titles. A Series results in a single map.
+        nrows (int): Number of rows of the grid
+        ncols (int): Number of columns of the grid, unused axes are hidden
+        column (str): Column of geo identifying the regions (default: 'Bundesland')
+        cmap: Colormap or its name (default: 'Oranges')
+        vmin (float): Lower limit of the color scale (default: None, minimum of all values)
+        vmax (float): Upper limit of the color scale (default: None, maximum of all values)
+        cbar_label (str): Label of the shared colorbar (default: None)
+        edgecolor: Color of the region borders (default: 'black')
+        linewidth (float): Width of the region borders (default: .1)
+        figsize (tuple): Size of the figure (default: None, matplotlib default)
+
+    Returns:
+        fig (Figure): Figure with the maps
+        axs (np.ndarray): Axes of the grid
+    """
+    import matplotlib.pyplot as plt
+    aligned, cmap, norm = _prepare_choropleth(geo, values, column, cmap, vmin, vmax)
+    titles = list(values.columns) if values.ndim > 1 else [values.name]
+    paths = geometry_to_paths(geo.geometry)
+    xmin, xmax, ymin, ymax = _choropleth_limits(paths)
+
+    fig, axs = plt.subplots(nrows, ncols, layout='constrained', figsize=figsize, squeeze=False)
+    collection = None
+    for i, ax in enumerate(axs.flatten()):
+        ax.set_axis_off()
+        if i >= aligned.shape[1]:
+            continue
+        collection = _add_choropleth(ax, paths, aligned[:, i], cmap, norm, edgecolor, linewidth)
+        ax.set(xlim=(xmin, xmax), ylim=(ymin, ymax), aspect='equal', title=titles[i])
+    if collection is not None:
+        fig.colorbar(collection, ax=axs, label=cbar_label, shrink=.6)
+    return fig, axs
+
+
+def _render_choropleth_frames(paths:list, aligned:np.ndarray, titles:list, fpaths:list, cmap, norm, edgecolor,
+                              linewidth:float, figsize, dpi:int, cbar_label:str):
+    """Renders frames with one figure and one collection, only the face colors and the title change per frame.
+       Used by export_choropleth_frames, also as task of the worker processes.
+    """
+    import matplotlib
+    matplotlib.use('Agg') # no display needed, also in worker processes
+    import matplotlib.pyplot as plt
+    xmin, xmax, ymin, ymax = _choropleth_limits(paths)
+    fig, ax = plt.subplots(figsize=figsize, layout='constrained')
+    ax.set_axis_off()
+    ax.set(xlim=(xmin, xmax), ylim=(ymin, ymax), aspect='equal')
+    collection = _add_choropleth(ax, paths, aligned[:, 0], cmap, norm, edgecolor, linewidth)
+    fig.colorbar(collection, ax=ax, label=cbar_label, shrink=.6)
+    for i, fpath in enumerate(fpaths):
+        collection.set_array(np.ma.masked_invalid(aligned[:, i]))
+        ax.set_title(titles[i])
+        fig.savefig(fpath, dpi=dpi)
+    plt.close(fig)
+    return fpaths
+
+
+def export_choropleth_frames(geo, values, out_dir:str, column:str='Bundesland', cmap='Oranges', vmin:float=None,
+                             vmax:float=None, cbar_label:str=None, edgecolor='black', linewidth:float=.1,
+                             figsize=None, dpi:int=150, fmt:str='png', workers:int=None) -> list:
+    """Exports one choropleth map per column of values as an image file (e.g. frames of an animation over years).
+       The frames are split into contiguous blocks rendered in parallel processes, each process builds the figure
+       once and only swaps the face colors per frame. All frames share one color scale.
+
+    Args:
+        geo (gpd.GeoDataFrame): Regions with the column identifying them and their geometry
+        values (pd.DataFrame): Values with one row per region and one column per frame, the column names are used as titles
+        out_dir (str): Directory of the image files, named frame_<number>.<fmt>
+        column (str): Column of geo identifying the regions (default: 'Bundesland')
+        cmap: Colormap or its name (default: 'Oranges')
+        vmin (float): Lower limit of the color scale (default: None, minimum of all values)
+        vmax (float): Upper limit of the color scale (default: None, maximum of all values)
+        cbar_label (str): Label of the colorbar (default: None)
+        edgecolor: Color of the region borders (default: 'black')
+        linewidth (float): Width of the region borders (default: .1)
+        figsize (tuple): Size of the figure (default: None, matplotlib default)
+        dpi (int): Resolution of the images (default: 150)
+        fmt (str): Image format (default: 'png')
+        workers (int): Number of worker processes, 1 renders in this process (default: None, one per CPU)
+
+    Returns:
+        fpaths (list): Paths of the written images, in the order of the columns
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    aligned, cmap, norm = _prepare_choropleth(geo, values, column, cmap, vmin, vmax)
+    titles = [str(title) for title in values.columns]
+    paths = geometry_to_paths(geo.geometry)
+    os.makedirs(out_dir, exist_ok=True)
+    fpaths = [os.path.join(out_dir, f'frame_{i:04d}.{fmt}') for i in range(len(titles))]
+
+    workers = min(workers or os.cpu_count() or 1, len(titles))
+    if workers <= 1:
+        return _render_choropleth_frames(paths, aligned, titles, fpaths, cmap, norm, edgecolor, linewidth, figsize, dpi, cbar_label)
+    blocks = np.array_split(np.arange(len(titles)), workers)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_choropleth_frames, paths, aligned[:, block], [titles[i] for i in block],
+                               [fpaths[i] for i in block], cmap, norm, edgecolor, linewidth, figsize, dpi, cbar_label)
+                   for block in blocks]
+        for future in futures:
+            future.result()
+    return fpaths
+
 # Temporal exploration
 
+TEMPORAL_FIGURES = ['yearly', 'monthly', 'comparison', 'stacked']
+
+
+def _new_figure(interactive:bool, **kwargs):
+    """Creates a figure managed by pyplot (shown in notebooks) or a standalone figure that needs no backend or display
+    """
+    if interactive:
+        import matplotlib.pyplot as plt
+        return plt.figure(**kwargs)
+    from matplotlib.figure import Figure
+    return Figure(**kwargs)
+
+
+def _month_dates(first_year:int, n:int) -> np.ndarray:
+    """Returns the first day of n consecutive months starting in January of first_year
+    """
+    return (np.datetime64(f'{first_year}-01', 'M') + np.arange(n)).astype('datetime64[D]')
+
+
+def _format_month_axis(ax, dates:np.ndarray, years):
+    """Limits a date axis to dates, labels every third month and marks the December of every year
+    """
+    import matplotlib.dates as mdates
+    ax.xaxis.set_major_locator(mdates.MonthLocator(bymonth=(1, 4, 7, 10)))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+    ax.set_xlim(dates[0], dates[-1])
+    ax.tick_params(axis='x', rotation=90)
+    for year in years:
+        ax.axvline(x=np.datetime64(f'{year}-12-01'), color='red')
+
+
 def create_temporal_plots(c1_cases_yearly, c1_years,
                  c2_cases_yearly, c2_years,
                  flat_c1_cases_monthly, flat_c2_cases_monthly, x_labels_monthly,
                  c1_key_name, c2_key_name,
-                 years):
-    
+                 years, show:bool=True, save_dir:str=None, fmt:str='png', dpi:int=150):
+    """Compares two crimes with yearly and monthly data in four figures: yearly cases, monthly cases, monthly cases
+       in one plot and the stacked monthly cases. The monthly x axis consists of dates starting in January of years[0].
+
+    Args:
+        c1_cases_yearly (list): Yearly cases of the first crime
+        c1_years (list): Years of c1_cases_yearly
+        c2_cases_yearly (list): Yearly cases of the second crime
+        c2_years (list): Years of c2_cases_yearly
+        flat_c1_cases_monthly (list): Monthly cases of the first crime, flattened over years
+        flat_c2_cases_monthly (list): Monthly cases of the second crime, flattened over years
+        x_labels_monthly (list): Deprecated and ignored, the x axis is derived from years. Pass None
+        c1_key_name (str): Name of the first crime
+        c2_key_name (str): Name of the second crime
+        years (range): Years of the monthly data
+        show (bool): Whether the figures are shown with pyplot and the correlations of the yearly and monthly cases are
+                     printed. If False, the figures are created without pyplot, so no display or backend is needed and
+                     they are returned instead (default: True)
+        save_dir (str): If given, the figures are written to <save_dir>/<name>.<fmt>, see TEMPORAL_FIGURES (default: None)
+        fmt (str): Image format of the written figures (default: 'png')
+        dpi (int): Resolution of the written figures (default: 150)
+
+    Returns:
+        figures (dict): Figures keyed by name if show is False, see TEMPORAL_FIGURES
+    """
+    if x_labels_monthly is not None:
+        warnings.warn('x_labels_monthly is ignored, the monthly x axis is derived from years. Pass None instead',
+                      DeprecationWarning, stacklevel=2)
+    n_months = max(len(flat_c1_cases_monthly), len(flat_c2_cases_monthly))
+    dates = _month_dates(years[0], n_months)
+    figures = dict()
+
     # Direct comparison with yearly data
-    fig, axs = plt.subplots(1, 3, figsize=(15, 6))
+    fig = _new_figure(show, figsize=(15, 6))
+    axs = fig.subplots(1, 3)
     axs[0].plot(c1_years, c1_cases_yearly)
     axs[0].set_title(c1_key_name)
     axs[1].plot(c2_years, c2_cases_yearly, color='red')
@@ -68,84 +302,130 @@ def create_temporal_plots(c1_cases_yearly, c1_years,
     axs[2].plot(c2_years, c2_cases_yearly, color='red')
     axs[2].set_title("Direct comparison")
     axs[2].legend([c1_key_name, c2_key_name])
-    plt.show()
-    plt.close()
-   
-
-    
+    figures['yearly'] = fig
 
     # plot monthly crimes over the years
-    fig, axs = plt.subplots(2, 1, figsize=(15, 18))
-    axs[0].plot(x_labels_monthly, flat_c1_cases_monthly)
+    fig = _new_figure(show, figsize=(15, 18))
+    axs = fig.subplots(2, 1)
+    axs[0].plot(dates[:len(flat_c1_cases_monthly)], flat_c1_cases_monthly)
     axs[0].set_title(f'{c1_key_name} from {years[0]} to {years[-1]}')
-    axs[0].tick_params(axis='x', rotation=90)
     axs[0].grid(True)
 
-    axs[1].plot(x_labels_monthly, flat_c2_cases_monthly)
+    axs[1].plot(dates[:len(flat_c2_cases_monthly)], flat_c2_cases_monthly)
     axs[1].set_title(f'{c2_key_name} from {years[0]} to {years[-1]}')
-    axs[1].tick_params(axis='x', rotation=90)
     axs[1].grid(True)
+    _format_month_axis(axs[0], dates, years)
+    _format_month_axis(axs[1], dates, years)
+    figures['monthly'] = fig
 
-    for year in years:
-        tick = 'Dez. ' + str(year)
-        axs[0].axvline(x=tick, color='red')
-        axs[1].axvline(x=tick, color='red')
-
-    n = 3  # Keeps every 7th label
-    [l.set_visible(False) for (i,l) in enumerate(axs[0].xaxis.get_ticklabels()) if i % n != 0]
-    [l.set_visible(False) for (i,l) in enumerate(axs[1].xaxis.get_ticklabels()) if i % n != 0]
-
-    plt.show()
-
-    
     # Compare them directly in one plot
     y_ticks=2000
-    fig, axs = plt.subplots(sharey=True, layout='constrained', figsize=(15,9))
-    axs.fill_between(x_labels_monthly, flat_c1_cases_monthly)
-    axs.fill_between(x_labels_monthly, flat_c2_cases_monthly)
-    axs.set(yscale='linear', title=f'{c1_key_name} vs. {c1_key_name}')
+    fig = _new_figure(show, layout='constrained', figsize=(15,9))
+    axs = fig.subplots(sharey=True)
+    axs.fill_between(dates[:len(flat_c1_cases_monthly)], flat_c1_cases_monthly)
+    axs.fill_between(dates[:len(flat_c2_cases_monthly)], flat_c2_cases_monthly)
+    axs.set(yscale='linear', title=f'{c1_key_name} vs. {c2_key_name}')
     axs.legend([c1_key_name, c2_key_name])
-    axs.tick_params(axis='x', rotation=90)
     axs.grid(True)
     monthly_max = max(np.max(flat_c2_cases_monthly), np.max(flat_c1_cases_monthly))
     monthly_y_ticks = np.arange(0, np.ceil(monthly_max/1000)*1000, y_ticks)
     axs.set_yticks(monthly_y_ticks)
-    [l.set_visible(False) for (i,l) in enumerate(axs.xaxis.get_ticklabels()) if i % n != 0] # Keep every n-th label
-    
-    for year in years:
-        tick = 'Dez. ' + str(year)
-        axs.axvline(x=tick, color='red')
-
-    plt.show()
+    _format_month_axis(axs, dates, years)
+    figures['comparison'] = fig
 
     # Plot the sum of them (with given sum key if given)
-    # Find the maximum length of the two lists
-    max_length = max(len(flat_c1_cases_monthly), len(flat_c2_cases_monthly))
     # Pad the shorter list with zeros to make them equal in length
-    flat_c1_cases_padded = np.pad(flat_c1_cases_monthly, (0, max_length - len(flat_c1_cases_monthly)))
-    flat_c2_cases_padded = np.pad(flat_c2_cases_monthly, (0, max_length - len(flat_c2_cases_monthly)))
+    flat_c1_cases_padded = np.pad(flat_c1_cases_monthly, (0, n_months - len(flat_c1_cases_monthly)))
+    flat_c2_cases_padded = np.pad(flat_c2_cases_monthly, (0, n_months - len(flat_c2_cases_monthly)))
     
     y_ticks_combined=5000
     
-    fig, axs = plt.subplots(sharey=True, layout='constrained', figsize=(15,9))
-    axs.fill_between(x_labels_monthly, flat_c1_cases_padded, alpha=0.5)
-    axs.fill_between(x_labels_monthly, flat_c2_cases_padded+flat_c1_cases_padded, flat_c1_cases_padded, alpha=0.5)
+    fig = _new_figure(show, layout='constrained', figsize=(15,9))
+    axs = fig.subplots(sharey=True)
+    axs.fill_between(dates, flat_c1_cases_padded, alpha=0.5)
+    axs.fill_between(dates, flat_c2_cases_padded+flat_c1_cases_padded, flat_c1_cases_padded, alpha=0.5)
     axs.legend([c1_key_name, c2_key_name])
-    axs.set(yscale='linear', title=f'{c1_key_name} + {c1_key_name}')
-    
-    axs.tick_params(axis='x', rotation=90)
+    axs.set(yscale='linear', title=f'{c1_key_name} + {c2_key_name}')
     axs.grid(True)
     monthly_max_combined = np.max(flat_c2_cases_padded+flat_c1_cases_padded)
     monthly_y_ticks_combined = np.arange(0, np.ceil(monthly_max_combined/1000)*1000, y_ticks_combined)
     axs.set_yticks(monthly_y_ticks_combined)
-    [l.set_visible(False) for (i,l) in enumerate(axs.xaxis.get_ticklabels()) if i % n != 0] # keep every n-th label
-
-    for year in years:
-        tick = 'Dez. ' + str(year)
-        axs.axvline(x=tick, color='red')
+    _format_month_axis(axs, dates, years)
+    figures['stacked'] = fig
 
+    if save_dir is not None:
+        import os
+        os.makedirs(save_dir, exist_ok=True)
+        for name, fig in figures.items():
+            fig.savefig(os.path.join(save_dir, f'{name}.{fmt}'), dpi=dpi)
+    if not show:
+        return figures
+    import matplotlib.pyplot as plt # imported here, so that importing this module does not load matplotlib
     plt.show()
+    print(f"Pearson product-moment correlation coefficients of {c1_key_name} and {c2_key_name} with yearly data: \n{np.corrcoef(c1_cases_yearly, c2_cases_yearly)}")
+    print(f"Pearson product-moment correlation coefficients of {c1_key_name} and {c2_key_name} with monthly data: \n{np.corrcoef(flat_c1_cases_monthly, flat_c2_cases_monthly)}")
+
+
+def _render_temporal_plots(tasks:list, fmt:str, dpi:int) -> list:
+    """Writes the figures of create_temporal_plots for several pairs, task of the worker processes of
+       export_temporal_plots. The figures are not managed by pyplot, so they are freed after each pair.
+    """
+    for kwargs in tasks:
+        create_temporal_plots(**kwargs, show=False, fmt=fmt, dpi=dpi)
+    return [kwargs['save_dir'] for kwargs in tasks]
+
+
+def export_temporal_plots(yearly_data:list, monthly_data:list, key_pairs:list, out_dir:str, names:dict=None,
+                          fmt:str='png', dpi:int=150, workers:int=None) -> dict:
+    """Writes the figures of create_temporal_plots for many pairs of crime keys without a display (e.g. for a report).
+       The cases of all keys are extracted once, the pairs are rendered in parallel processes.
+
+    Args:
+        yearly_data (list[tuple[int, pd.DataFrame]]): T01 tables generated by transform_df_to_list
+        monthly_data (list[tuple[int, pd.DataFrame]]): T08 tables generated by transform_df_to_list, sorted by year
+        key_pairs (list): Pairs of crime keys (key1, key2)
+        out_dir (str): Directory of the figures, each pair is written to <out_dir>/<key1>_<key2>/<name>.<fmt>
+        names (dict): Crime names by key (default: None, names of the newest table in yearly_data)
+        fmt (str): Image format (default: 'png')
+        dpi (int): Resolution of the images (default: 150)
+        workers (int): Number of worker processes, 1 renders in this process (default: None, one per CPU)
+
+    Returns:
+        fpaths (dict): Per pair, the written figure paths keyed by name (see TEMPORAL_FIGURES)
+    """
+    import os
+    from concurrent.futures import ProcessPoolExecutor
+    from .DataFunctions import get_monthly_cases_by_keys, get_yearly_cases_by_keys
+    key_pairs = [tuple(pair) for pair in key_pairs]
+    keys = list(dict.fromkeys(key for pair in key_pairs for key in pair))
+    if names is None:
+        newest = yearly_data[-1][1].drop_duplicates('Schlüssel')
+        names = dict(zip(newest['Schlüssel'], newest['Straftat']))
+    monthly_years, monthly = get_monthly_cases_by_keys(monthly_data, keys, True)
+    yearly_years, yearly = get_yearly_cases_by_keys(keys, yearly_data)
+    yearly = np.nan_to_num(yearly[:, :, 0]) # missing keys count as 0 cases, as in get_yearly_cases_by_key
+    monthly = monthly.reshape(len(keys), -1)
+    position = {key: i for i, key in enumerate(keys)}
+
+    tasks = []
+    for key1, key2 in key_pairs:
+        i, j = position[key1], position[key2]
+        tasks.append({'c1_cases_yearly': yearly[i], 'c1_years': yearly_years,
+                      'c2_cases_yearly': yearly[j], 'c2_years': yearly_years,
+                      'flat_c1_cases_monthly': monthly[i], 'flat_c2_cases_monthly': monthly[j],
+                      'x_labels_monthly': None,
+                      'c1_key_name': names.get(key1, key1), 'c2_key_name': names.get(key2, key2),
+                      'years': monthly_years,
+                      'save_dir': os.path.join(out_dir, f'{key1}_{key2}')})
 
-    # Compute Correlation coefficient for all cases in a year
-    print(f"Pearson product-moment correlation coefficients of {c1_key_name} and {c2_key_name} with yearly data: \n{np.corrcoef(c1_cases_yearly, c2_cases_yearly)}") 
-    print(f"Pearson product-moment correlation coefficients of {c1_key_name} and {c2_key_name} with monthly data: \n{np.corrcoef(flat_c1_cases_monthly, flat_c2_cases_monthly)}")
\ No newline at end of file
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        _render_temporal_plots(tasks, fmt, dpi)
+    else:
+        blocks = np.array_split(np.arange(len(tasks)), workers)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render_temporal_plots, [tasks[i] for i in block], fmt, dpi) for block in blocks]
+            for future in futures:
+                future.result()
+    return {pair: {name: os.path.join(task['save_dir'], f'{name}.{fmt}') for name in TEMPORAL_FIGURES}
+            for pair, task in zip(key_pairs, tasks)}
@@ -0,0 +1,205 @@
+import os
+import numpy as np
+import pandas as pd
+from .DataCache import file_fingerprint, get_default_cache_dir
+
+# Bump when the way the lookup table is built changes, so that the cached table is rebuilt
+PLZ_VERSION = 1
+# Region levels of the lookup table: level -> column holding the region name
+PLZ_LEVELS = {'Ort': 'Ort',
+              'Kreis': 'Kreis',
+              'Kreisschlüssel': 'Kreisschlüssel',
+              'Bundesland': 'Bundesland'}
+# Postal codes have five digits, so a dense array over all possible codes maps them to rows in O(1)
+PLZ_SPACE = 100000
+
+
+def build_plz_table(plz_dir:str='../dat/PLZ/') -> pd.DataFrame:
+    """Joins the postal code assignments (zuordnung_plz_ort.csv) and inhabitants (plz_einwohner.csv) into one row per PLZ.
+       A PLZ spanning several municipalities is assigned to the Kreis with most of them (ties: first in the file),
+       its Ort is the first municipality of that Kreis. Kreisfreie Städte use the name of the city as Kreis.
+
+    Args:
+        plz_dir (str): Directory containing the PLZ files (default: '../dat/PLZ/')
+
+    Returns:
+        table (pd.DataFrame): Table indexed by the integer PLZ with the columns Ort, Kreis, Kreisschlüssel,
+                              Bundesland (categoricals), Einwohner, Fläche (km²), lat and lon
+    """
+    regions = pd.read_csv(os.path.join(plz_dir, 'zuordnung_plz_ort.csv'), dtype=str)
+    inhabitants = pd.read_csv(os.path.join(plz_dir, 'plz_einwohner.csv'), dtype={'plz': str})
+
+    regions['Kreisschlüssel'] = regions['ags'].str[:5]
+    regions['Kreis'] = regions['landkreis'].fillna(regions['ort'])
+    regions['order'] = np.arange(len(regions))
+    # number of municipalities of the PLZ in the same Kreis, the Kreis with most municipalities wins
+    regions['count'] = regions.groupby(['plz', 'Kreisschlüssel'])['ort'].transform('size')
+    regions = regions.sort_values(['plz', 'count', 'order'], ascending=[True, False, True])
+    regions = regions.drop_duplicates('plz')
+
+    table = regions[['plz', 'ort', 'Kreis', 'Kreisschlüssel', 'bundesland']].merge(
+        inhabitants[['plz', 'einwohner', 'qkm', 'lat', 'lon']], on='plz', how='outer')
+    table = table.rename(columns={'ort': 'Ort', 'bundesland': 'Bundesland', 'einwohner': 'Einwohner', 'qkm': 'Fläche'})
+    table.index = table.pop('plz').astype(np.int32).rename('PLZ')
+    for col in ['Ort', 'Kreis', 'Kreisschlüssel', 'Bundesland']:
+        table[col] = table[col].astype('category')
+    table['Einwohner'] = table['Einwohner'].fillna(0).astype(np.int64)
+    for col in ['Fläche', 'lat', 'lon']:
+        table[col] = table[col].astype(np.float32)
+    return table.sort_index()
+
+
+class PlzLookup(object):
+    """
+        This is a class for mapping postal codes to their Ort, Kreis and Bundesland and aggregating values per region.
+        Postal codes are integer coded, lookups index a dense array instead of joining on strings.
+    """
+    def __init__(self, table:pd.DataFrame):
+        """Creates the lookup of a table created by build_plz_table
+
+        Params:
+            table (pd.DataFrame): Table indexed by the integer PLZ
+        """
+        self.table = table
+        # PLZ -> row of the table, -1 for unknown codes
+        self._rows = np.full(PLZ_SPACE, -1, dtype=np.int32)
+        self._rows[table.index.to_numpy()] = np.arange(len(table), dtype=np.int32)
+        # row -> region code per level, the region names are the categories of the columns
+        self._codes = {level: table[col].cat.codes.to_numpy() for level, col in PLZ_LEVELS.items()}
+        self._population = table['Einwohner'].to_numpy()
+
+    @classmethod
+    def from_files(cls, plz_dir:str='../dat/PLZ/', use_cache:bool=True, cache_dir:str=None):
+        """Creates the lookup from the PLZ files. The built table is stored in the cache directory and only rebuilt
+           when one of the files changes.
+
+        Args:
+            plz_dir (str): Directory containing the PLZ files (default: '../dat/PLZ/')
+            use_cache (bool): Whether the table is read from and written to the cache (default: True)
+            cache_dir (str): Directory of the cached table (default: None, next to the data root, e.g. '../dat/cache/')
+
+        Returns:
+            lookup (PlzLookup): Lookup of all postal codes
+        """
+        if not use_cache:
+            return cls(build_plz_table(plz_dir))
+        cache_dir = cache_dir or get_default_cache_dir(plz_dir)
+        fingerprint = file_fingerprint(os.path.join(plz_dir, 'zuordnung_plz_ort.csv'),
+                                       file_fingerprint(os.path.join(plz_dir, 'plz_einwohner.csv'), PLZ_VERSION))
+        path = os.path.join(cache_dir, f'PLZ_{fingerprint}.pkl')
+        if os.path.exists(path):
+            return cls(pd.read_pickle(path))
+
+        table = build_plz_table(plz_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        for file in os.listdir(cache_dir):
+            if file.startswith('PLZ_') and file.endswith('.pkl'):
+                os.remove(os.path.join(cache_dir, file))
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        table.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        return cls(table)
+
+    def __len__(self):
+        return len(self.table)
+
+    def encode(self, plz) -> np.ndarray:
+        """Converts postal codes (str or int, e.g. '01067' or 1067) to table rows
+
+        Args:
+            plz: Postal codes (array-like)
+
+        Returns:
+            rows (np.ndarray): Row of each postal code in the table, -1 for invalid or unknown codes
+        """
+        plz = np.asarray(plz)
+        if plz.dtype.kind in 'iu':
+            codes = plz.astype(np.int64)
+            valid = (codes >= 0) & (codes < PLZ_SPACE)
+            rows = np.full(len(codes), -1, dtype=np.int32)
+            rows[valid] = self._rows[codes[valid]]
+            return rows
+        # parse every distinct code only once, millions of rows contain at most a few thousand different codes
+        inverse, uniques = pd.factorize(pd.Series(plz, dtype=object), use_na_sentinel=False)
+        codes = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        valid = (codes >= 0) & (codes < PLZ_SPACE) & (codes == np.floor(codes))
+        unique_rows = np.full(len(codes), -1, dtype=np.int32)
+        unique_rows[valid] = self._rows[codes[valid].astype(np.int64)]
+        return unique_rows[inverse]
+
+    def lookup(self, plz, column:str='Bundesland') -> np.ndarray:
+        """Returns a column of the table for each postal code
+
+        Args:
+            plz: Postal codes (array-like)
+            column (str): Column of the table (default: 'Bundesland')
+
+        Returns:
+            values (np.ndarray): Value of the column for each postal code, missing value for unknown codes
+        """
+        rows = self.encode(plz)
+        values = self.table[column].take(np.maximum(rows, 0)).to_numpy()
+        if (rows < 0).any():
+            values = pd.Series(values).where(rows >= 0).to_numpy()
+        return values
+
+    def region_codes(self, plz, level:str='Bundesland') -> np.ndarray:
+        """Returns the integer code of the region of each postal code, the names are self.regions(level)
+
+        Args:
+            plz: Postal codes (array-like)
+            level (str): Region level, see PLZ_LEVELS (default: 'Bundesland')
+
+        Returns:
+            codes (np.ndarray): Region code of each postal code, -1 for unknown codes or regions
+        """
+        rows = self.encode(plz)
+        codes = self._codes[level][np.maximum(rows, 0)]
+        return np.where(rows >= 0, codes, -1)
+
+    def regions(self, level:str='Bundesland') -> pd.Index:
+        """Returns the names of the regions of a level, ordered by their code
+        """
+        return pd.Index(self.table[PLZ_LEVELS[level]].cat.categories, name=level)
+
+    def aggregate(self, plz, values=None, level:str='Bundesland') -> pd.Series:
+        """Sums values per region, rows with unknown postal codes are ignored
+
+        Args:
+            plz: Postal code of each row (array-like)
+            values: Value of each row (array-like), counts the rows if not specified (default: None)
+            level (str): Region level, see PLZ_LEVELS (default: 'Bundesland')
+
+        Returns:
+            sums (pd.Series): Sum per region, indexed by all regions of the level
+        """
+        codes = self.region_codes(plz, level)
+        valid = codes >= 0
+        weights = None if values is None else np.asarray(values, dtype=np.float64)[valid]
+        regions = self.regions(level)
+        sums = np.bincount(codes[valid], weights=weights, minlength=len(regions))
+        return pd.Series(sums, index=regions)
+
+    def population(self, level:str='Bundesland') -> pd.Series:
+        """Returns the inhabitants per region (the inhabitants of a PLZ count for the region it is assigned to)
+        """
+        codes = self._codes[level]
+        valid = codes >= 0
+        regions = self.regions(level)
+        population = np.bincount(codes[valid], weights=self._population[valid], minlength=len(regions))
+        return pd.Series(population, index=regions)
+
+    def rates(self, plz, values=None, level:str='Bundesland', per:float=1e5) -> pd.Series:
+        """Computes values per inhabitants for each region (e.g. cases per 100,000 inhabitants)
+
+        Args:
+            plz: Postal code of each row (array-like)
+            values: Value of each row (array-like), counts the rows if not specified (default: None)
+            level (str): Region level, see PLZ_LEVELS (default: 'Bundesland')
+            per (float): Number of inhabitants the rate refers to (default: 100,000)
+
+        Returns:
+            rates (pd.Series): Rate per region, NaN for regions without inhabitants
+        """
+        population = self.population(level)
+        return self.aggregate(plz, values, level) / population.where(population > 0) * per
@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pandas as pd
+from .DataLoaders import LKS01
+from .DataPanel import FEDERAL_TERRITORY, build_panel, compute_derived
+from .Instrumentation import stage
+
+# Area and population of the federal states (Gebietsstand 31.12.2022), source:
+# https://www.destatis.de/DE/Themen/Laender-Regionen/Regionales/Gemeindeverzeichnis/Administrativ/02-bundeslaender.html
+POPULATION_FILE = '../dat/Destatis/02-bundeslaender.xlsx'
+# Year of the population in POPULATION_FILE
+POPULATION_YEAR = 2022
+POPULATION_COLUMNS = ['Fläche', 'Einwohner', 'Dichte']
+# Columns of compute_rates
+RATE_COLUMNS = ['value', 'rate', 'density_rate', 'share', 'yoy', 'yoy_pct']
+
+
+def load_population(fpath:str=POPULATION_FILE, year:int=POPULATION_YEAR) -> pd.DataFrame:
+    """Loads area, inhabitants and inhabitants per km² of the federal states and Germany from the Destatis table.
+       The rows of the capitals are dropped and the states are named like in the LKS01 tables (without their number,
+       FEDERAL_TERRITORY for Germany).
+
+    Args:
+        fpath (str): Path of 02-bundeslaender.xlsx (default: POPULATION_FILE)
+        year (int): Year of the population in the file (default: POPULATION_YEAR)
+
+    Returns:
+        population (pd.DataFrame): Columns Fläche (km²), Einwohner and Dichte (inhabitants per km²), indexed by year
+                                   and Bundesland. Populations of several years can be combined with pd.concat
+    """
+    df = pd.read_excel(fpath, sheet_name='Bundesländer_mit_Hauptstädten', skiprows=6, skipfooter=16)
+    df = df.rename(columns={'Unnamed: 0': 'Bundesland', 'Unnamed: 1': 'Hauptstadt', 'Unnamed: 2': 'Fläche',
+                            'Unnamed: 3': 'Einwohner', 'Unnamed: 6': 'Dichte'})
+    # states have their number in the first column, capitals only a name in the second one, Germany is the last row
+    is_germany = df['Hauptstadt'].astype(str).str.strip() == 'Deutschland'
+    df.loc[is_germany, 'Bundesland'] = FEDERAL_TERRITORY
+    df = df[df['Bundesland'].notna()]
+    df['Bundesland'] = df['Bundesland'].astype(str).str.replace(r'^\d+', '', regex=True).str.strip()
+    df.insert(0, 'year', year)
+    return df.set_index(['year', 'Bundesland'])[POPULATION_COLUMNS].astype(float)
+
+
+def compute_rates(root_dir:str='../dat/PKS/', years:range=None, metric:str='Anzahl erfasste Fälle',
+                  population:pd.DataFrame=None, per:float=1e5) -> pd.DataFrame:
+    """Computes for all keys and federal states of the LKS01 tables of the given years: the rate per `per` inhabitants
+       (Häufigkeitszahl), the value per inhabitant per km², the share of all crimes ('------') of the same state and
+       year (share in %) and the change to the previous year (yoy, yoy_pct in %). The values, shares, changes and rates
+       are computed by compute_derived of the LKS01 panel, the population is joined by year and name of the federal state.
+
+    Args:
+        root_dir (str): Directory of the yearly PKS directories (default: '../dat/PKS/')
+        years (range): Years, years without a table are skipped (default: None, the years of the population)
+        metric (str): Count of the LKS01 tables (default: 'Anzahl erfasste Fälle')
+        population (pd.DataFrame): Einwohner and Dichte indexed by year and Bundesland
+                                   (default: None, load_population of the 'Destatis' directory next to root_dir)
+        per (float): Number of inhabitants of the rate (default: 1e5)
+
+    Raises:
+        ValueError: If the population of a year or federal state is missing
+
+    Returns:
+        rates (pd.DataFrame): Columns of RATE_COLUMNS indexed by year, Bundesland and Schlüssel, keys missing in
+                              a state and year are left out
+    """
+    if population is None:
+        population = load_population(os.path.join(os.path.dirname(os.path.normpath(root_dir)), 'Destatis',
+                                                  os.path.basename(POPULATION_FILE)))
+    if population.index.names != ['year', 'Bundesland']:
+        raise ValueError('The population must be indexed by year and Bundesland')
+    population_years = sorted(set(population.index.get_level_values('year')))
+    years = population_years if years is None else list(years)
+    missing = [year for year in years if year not in population_years]
+    if len(missing) > 0:
+        raise ValueError(f'No population for the years: {missing}. Population is given for: {population_years}')
+    # the previous years are loaded for the changes to the previous year
+    panel = build_panel(root_dir, sorted(set(years) | set(year - 1 for year in years)), tables=[LKS01.table],
+                        workers=1, metrics=[metric])
+
+    with stage('compute_rates', metric=metric) as st:
+        derived = compute_derived(panel, years, population['Einwohner'], per)
+        states = pd.MultiIndex.from_arrays([derived.index.get_level_values('year'),
+                                            derived.index.get_level_values('Bundesland').astype(str)])
+        missing = sorted(set(states[~states.isin(population.index)].get_level_values('Bundesland')))
+        if len(missing) > 0:
+            raise ValueError(f'No population for: {missing}')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            derived['density_rate'] = derived['value'].to_numpy() / population['Dichte'].reindex(states).to_numpy(dtype=float)
+        rates = derived.droplevel(['table', 'metric'])[RATE_COLUMNS].replace([np.inf, -np.inf], np.nan)
+        st.record(rates)
+    return rates
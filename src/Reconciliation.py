@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from .DataFunctions import get_months
+from .DataLoaders import T01DataLoader, T08DataLoader, LKS01
+from .Schemas import FEDERAL_TERRITORY
+from .Instrumentation import stage
+
+CASES = 'Anzahl erfasste Fälle'
+ATTEMPTS = 'erfasste Fälle: Anzahl Versuche'
+SOLVED = 'Aufklärung: Anzahl Fälle'
+SUSPECTS = 'Tatverdächtige: insgesamt'
+UNKNOWN_MONTH = 'Tatzeit unbekannt'
+
+# Identities checked by reconcile, the expected value is compared with the actual value of every key and year:
+#   t08_months:           T08 cases = sum of the months + cases with unknown month (T08, years with that column)
+#   lks01_states_federal: federal row = sum of the 16 federal states (LKS01, additive metrics only, a suspect
+#                         can be counted in several states)
+#   lks01_federal_t01:    T01 = federal row of LKS01
+RECONCILIATION_CHECKS = ['t08_months', 'lks01_states_federal', 'lks01_federal_t01']
+# Comparisons that are no identities and only run if requested explicitly:
+#   t01_t08_completed:    T01 cases - attempts vs. T08 cases (as compared in the temporal notebook, they differ for
+#                         most keys and years)
+INFORMATIONAL_CHECKS = ['t01_t08_completed']
+STATE_METRICS = [CASES, ATTEMPTS, SOLVED]
+FEDERAL_METRICS = [CASES, ATTEMPTS, SOLVED, SUSPECTS]
+# Counts stored as text with German thousands separators, e.g. '307.411' in T08 2016 and 2021
+GROUPED_NUMBER = r'^\d{1,3}(?:\.\d{3})+$'
+
+
+def _to_number(values:pd.Series) -> pd.Series:
+    """Converts a column to numbers, text with German thousands separators is read as integer and other
+       non-numeric cells become NaN
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    numbers = pd.to_numeric(values, errors='coerce')
+    if values.dtype == object:
+        # candidates parse to fractions or not at all, of these only text cells are converted (numeric cells are kept as they are)
+        candidates = values[(numbers % 1 != 0) | (numbers.isna() & values.notna())]
+        text = candidates[candidates.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)].str.strip()
+        grouped = text[text.str.match(GROUPED_NUMBER)]
+        numbers[grouped.index] = pd.to_numeric(grouped.str.replace('.', '', regex=False))
+    return numbers
+
+
+def _stack(tables:pd.DataFrame, columns:list, by:list=None) -> pd.DataFrame:
+    """Converts the columns of the concatenated tables of all years to numbers (see _to_number) and sums rows with
+       the same year and key. Columns missing in a year are NaN.
+
+    Args:
+        tables (pd.DataFrame): Tables of all years with a 'Jahr' column, see DataLoader.load_many(as_frame=True)
+        columns (list): Numeric columns
+        by (list): Columns identifying a row besides the year (default: None, ['Schlüssel'])
+
+    Returns:
+        values (pd.DataFrame): Values indexed by Jahr and the columns of by
+    """
+    by = list(by) if by is not None else ['Schlüssel']
+    values = pd.DataFrame({col: tables[col].astype(str) for col in by})
+    values.insert(0, 'Jahr', tables['Jahr'].to_numpy())
+    for col in columns:
+        values[col] = _to_number(tables[col]) if col in tables.columns else np.nan
+    return values.groupby(['Jahr'] + by, sort=True)[columns].sum(min_count=1)
+
+
+def _compare(check:str, metric:str, expected:pd.Series, actual:pd.Series) -> pd.DataFrame:
+    """Aligns expected and actual values of the same year and key, rows missing or non-numeric on one side are skipped
+    """
+    joined = pd.concat({'expected': expected, 'actual': actual}, axis=1, join='inner').dropna()
+    joined['difference'] = joined['actual'] - joined['expected']
+    joined = joined.reset_index()
+    joined.insert(0, 'metric', metric)
+    joined.insert(0, 'check', check)
+    return joined
+
+
+def _load(loader, years) -> pd.DataFrame:
+    """Loads the tables of the given years that exist for the loader as one long DF with a 'Jahr' column
+    """
+    available = set(loader.available_years())
+    tables, errors = loader.load_many([year for year in years if year in available], workers=1, as_frame=True)
+    if len(errors) > 0:
+        year, error = next(iter(errors.items()))
+        raise Exception(f'Could not load data for {year}') from error
+    return tables
+
+
+def reconcile(root_dir:str='../dat/PKS/', years:range=range(2012, 2023), checks:list=None,
+              tolerance:float=0) -> tuple:
+    """Checks the identities between the T01, T08 and LKS01 tables (see RECONCILIATION_CHECKS) for every key and year
+       in one vectorized pass over the loaded tables.
+
+    Args:
+        root_dir (str): Directory of the yearly PKS directories (default: '../dat/PKS/')
+        years (range): Years to check, years without a table are skipped (default: range(2012, 2023))
+        checks (list): Checks of RECONCILIATION_CHECKS or INFORMATIONAL_CHECKS (default: None, RECONCILIATION_CHECKS)
+        tolerance (float): Absolute difference still counted as consistent (default: 0)
+
+    Raises:
+        ValueError: If a check is unknown
+
+    Returns:
+        summary (pd.DataFrame): Per check, metric and year: number of compared keys, mismatches and the largest
+                                absolute difference
+        discrepancies (pd.DataFrame): One row per inconsistent key and year with the columns check, metric, Jahr,
+                                      Schlüssel, expected, actual and difference
+    """
+    checks = RECONCILIATION_CHECKS if checks is None else list(checks)
+    unknown = [check for check in checks if check not in RECONCILIATION_CHECKS + INFORMATIONAL_CHECKS]
+    if len(unknown) > 0:
+        raise ValueError(f'Unknown checks: {unknown}. Use some of {RECONCILIATION_CHECKS + INFORMATIONAL_CHECKS}')
+
+    months = get_months()
+    results = []
+    with stage('reconcile.load'):
+        t01 = t08 = states = federal = None
+        if {'t01_t08_completed', 'lks01_federal_t01'} & set(checks):
+            t01 = _stack(_load(T01DataLoader(root_dir), years), FEDERAL_METRICS)
+        if {'t08_months', 't01_t08_completed'} & set(checks):
+            t08 = _stack(_load(T08DataLoader(root_dir), years), [CASES, UNKNOWN_MONTH] + months)
+        if {'lks01_states_federal', 'lks01_federal_t01'} & set(checks):
+            lks = _load(LKS01(root_dir), years)
+            is_federal = (lks['Bundesland'].astype(str) == FEDERAL_TERRITORY).to_numpy()
+            states = _stack(lks[~is_federal], FEDERAL_METRICS)
+            federal = _stack(lks[is_federal], FEDERAL_METRICS)
+
+    with stage('reconcile.compare', checks=len(checks)):
+        if 't08_months' in checks:
+            # years without the column of unknown months (2013) cannot be checked
+            has_unknown = t08[UNKNOWN_MONTH].notna().groupby(level='Jahr').transform('any')
+            monthly_sum = (t08[months].sum(axis=1, min_count=12) + t08[UNKNOWN_MONTH].fillna(0)).where(has_unknown)
+            results.append(_compare('t08_months', CASES, t08[CASES], monthly_sum))
+        if 't01_t08_completed' in checks:
+            results.append(_compare('t01_t08_completed', CASES, t01[CASES] - t01[ATTEMPTS], t08[CASES]))
+        if 'lks01_states_federal' in checks:
+            for metric in STATE_METRICS:
+                results.append(_compare('lks01_states_federal', metric, federal[metric], states[metric]))
+        if 'lks01_federal_t01' in checks:
+            for metric in FEDERAL_METRICS:
+                results.append(_compare('lks01_federal_t01', metric, t01[metric], federal[metric]))
+
+        compared = pd.concat(results, ignore_index=True)
+        compared['abs_difference'] = compared['difference'].abs()
+        compared['mismatch'] = compared['abs_difference'] > tolerance
+        summary = compared.groupby(['check', 'metric', 'Jahr'], sort=False).agg(
+            compared=('mismatch', 'size'),
+            mismatches=('mismatch', 'sum'),
+            max_abs_difference=('abs_difference', 'max'))
+        discrepancies = compared[compared['mismatch']].drop(columns=['abs_difference', 'mismatch']).reset_index(drop=True)
+    return summary, discrepancies
@@ -0,0 +1,290 @@
+import fnmatch
+
+# Column names of the T20 tables, which are read without header (columns numbered from 1)
+T20_COLUMNS = {1: 'Schlüssel',
+               2: 'Straftat',
+               3: 'Sex',
+               4: 'Anzahl erfasste TV',
+               5: '0-5',
+               6: '6-7',
+               7: '8-9',
+               8: '10-11',
+               9: '12-13',
+               10: '0-13',
+               11: '14-15',
+               12: '16-17',
+               13: '14-17',
+               14: '18-20',
+               15: '0-20',
+               16: '21-22',
+               17: '23-24',
+               18: '21-24',
+               19: '25-29',
+               20: '30-39',
+               21: '40-49',
+               22: '50-59',
+               23: '>60',
+               24: '>21'}
+
+# Column names of the T08 tables after converting the column numbers in the header to integers
+T08_COLUMNS = {1: 'Schlüssel',
+               2: 'Straftat',
+               3: 'Anzahl erfasste Fälle',
+               4: 'Jan.',
+               5: 'Febr.',
+               6: 'März',
+               7: 'April',
+               8: 'Mai',
+               9: 'Juni',
+               10: 'Juli',
+               11: 'Aug.',
+               12: 'Sept.',
+               13: 'Okt.',
+               14: 'Nov.',
+               15: 'Dez.',
+               16: 'Tatzeit unbekannt',
+               'Unnamed: 2': 'Schlüssel gültig von',
+               17: 'Schlüssel gültig von',
+               'Unnamed: 3': 'Schlüssel gültig bis',
+               18: 'Schlüssel gültig bis',
+               'Unnamed: 18': 'Sort'}
+
+T01_COLUMNS_2016_2022 = {'erfasste Fälle': 'Anzahl erfasste Fälle',
+                         'erfasste Fälle davon:\nVersuche': 'erfasste Fälle: Anzahl Versuche',
+                         'von Spalte 3\nVersuche': 'erfasste Fälle: Anzahl Versuche',
+                         'Unnamed: 5': 'erfasste Fälle: Versuche in %',
+                         'Tatortverteilung': 'Tatortverteilung: bis unter 20.000 Einwohner',
+                         'Unnamed: 7': 'Tatortverteilung: 20.000 bis unter 100.000',
+                         'Unnamed: 8': 'Tatortverteilung: 100.000 bis unter 500.000',
+                         'Unnamed: 9': 'Tatortveteilung: 500.000 und mehr',
+                         'Unnamed: 10': 'Tatortverteilung: unbekannt',
+                         'mit Schusswaffe': 'mit Schusswaffe: gedroht',
+                         'Unnamed: 12': 'mit Schusswaffe: geschossen',
+                         'Aufklärung': 'Aufklärung: Anzahl Fälle',
+                         'Unnamed: 14': 'Aufklärung: in % (AQ)',
+                         'Tatverdächtige': 'Tatverdächtige: insgesamt',
+                         'Tat-verdächtige insgesamt': 'Tatverdächtige: insgesamt', # 2016 - 2019
+                         'Unnamed: 16': 'Tatverdächtige: männlich',
+                         'von Spalte 16': 'Tatverdächtige: männlich', # 2016 - 2019
+                         'Unnamed: 17': 'Tatverdächtige: weiblich',
+                         'Nichtdeutsche Tatverdächtige': 'Nichtdeutsche Tatverdächtige: Anzahl',
+                         'Unnamed: 18': 'Nichtdeutsche Tatverdächtige: Anzahl', # 2016 - 2019
+                         'Unnamed: 19': 'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'}
+
+T01_COLUMNS_2012_2015 = {'Schl.': 'Schlüssel', # only applies to 2015
+                         'Schl.-': 'Schlüssel',
+                         'Unnamed: 1': 'Straftat',
+                         'erfasste Fälle': 'Anzahl erfasste Fälle', # 2015
+                         'Unnamed: 2': 'Anzahl erfasste Fälle',
+                         'Unnamed: 3': '%-Anteil an allen Fällen',
+                         'Unnamed: 4': 'erfasste Fälle: Anzahl Versuche',
+                         'von Spalte 3\nVersuche': 'erfasste Fälle: Anzahl Versuche', # 2015
+                         'Unnamed: 5': 'erfasste Fälle: Versuche in %',
+                         'Tatortverteilung': 'Tatortverteilung: bis unter 20.000 Einwohner',
+                         'Unnamed: 7': 'Tatortverteilung: 20.000 bis unter 100.000',
+                         'Unnamed: 8': 'Tatortverteilung: 100.000 bis unter 500.000',
+                         'Unnamed: 9': 'Tatortveteilung: 500.000 und mehr',
+                         'Unnamed: 10': 'Tatortverteilung: unbekannt',
+                         'mit Schusswaffe': 'mit Schusswaffe: gedroht',
+                         'Unnamed: 12': 'mit Schusswaffe: geschossen',
+                         'Aufklärung': 'Aufklärung: Anzahl Fälle',
+                         'Unnamed: 14': 'Aufklärung: in % (AQ)',
+                         'Gesamtzahl': 'Tatverdächtige: insgesamt',
+                         'Tat-verdächtige insgesamt': 'Tatverdächtige: insgesamt', # 2015
+                         'von Spalte 16': 'Tatverdächtige: männlich',
+                         'Unnamed: 17': 'Tatverdächtige: weiblich',
+                         'Unnamed: 18': 'Nichtdeutsche Tatverdächtige: Anzahl',
+                         'Unnamed: 19': 'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'}
+
+LKS01_COLUMNS_2019_2022 = {'erfasste Fälle': 'Anzahl erfasste Fälle', # 2019
+                           'erfasste Fälle davon:\nVersuche': 'erfasste Fälle: Anzahl Versuche',
+                           'von Spalte 3\nVersuche': 'erfasste Fälle: Anzahl Versuche', # 2019
+                           'Unnamed: 6': 'erfasste Fälle: Versuche in %',
+                           'Tatortverteilung': 'Tatortverteilung: bis unter 20.000 Einwohner',
+                           'Unnamed: 8': 'Tatortverteilung: 20.000 bis unter 100.000',
+                           'Unnamed: 9': 'Tatortverteilung: 100.000 bis unter 500.000',
+                           'Unnamed: 10': 'Tatortverteilung: 500.000 und mehr',
+                           'Unnamed: 11': 'Tatortverteilung: unbekannt',
+                           'mit Schusswaffe': 'mit Schusswaffe: gedroht',
+                           'Unnamed: 13': 'mit Schusswaffe: geschossen',
+                           'Aufklärung': 'Aufklärung: Anzahl Fälle',
+                           'Unnamed: 15': 'Aufklärung: in % (AQ)',
+                           'Tatverdächtige': 'Tatverdächtige: insgesamt',
+                           'Tat-verdächtige insgesamt': 'Tatverdächtige: insgesamt', # 2019
+                           'Unnamed: 17': 'Tatverdächtige: männlich',
+                           'von Spalte 16': 'Tatverdächtige: männlich',
+                           'Unnamed: 18': 'Tatverdächtige: weiblich',
+                           'Nichtdeutsche Tatverdächtige': 'Nichtdeutsche Tatverdächtige: Anzahl',
+                           'Unnamed: 19': 'Nichtdeutsche Tatverdächtige: Anzahl', # 2019
+                           'Unnamed: 20': 'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'}
+
+# confirmed for 2018,2017,2016,2015
+LKS01_COLUMNS_2015_2018 = {'erfasste Fälle': 'Anzahl erfasste Fälle',
+                           'von Spalte 4 Versuche': 'erfasste Fälle: Anzahl Versuche',
+                           'Unnamed: 6': 'erfasste Fälle: Versuche in %',
+                           'Unnamed: 7': 'erfasste Fälle: Versuche in %', # 2018
+                           'Aufklärung': 'Aufklärung: Anzahl Fälle',
+                           'Unnamed: 8': 'Aufklärung: in % (AQ)', # really the same?
+                           'Unnamed: 9': 'Aufklärung: in % (AQ)', # really the same?
+                           'Tatver-dächtige insg.': 'Tatverdächtige: insgesamt',
+                           'Nichtdeutsche Tat-verdächtige': 'Nichtdeutsche Tatverdächtige: Anzahl',
+                           'Unnamed: 11': 'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %',
+                           'Unnamed: 12': 'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'} # 2018
+
+LKS01_COLUMNS_2013_2014 = {'Strft. Schl.': 'Schlüssel',
+                           'erfasste Fälle 2013': 'Anzahl erfasste Fälle',
+                           'erfasste Fälle 2014': 'Anzahl erfasste Fälle',
+                           'Versuche absolut': 'erfasste Fälle: Anzahl Versuche',
+                           'Versuche in %': 'erfasste Fälle: Versuche in %',
+                           'Versuche in % ': 'erfasste Fälle: Versuche in %',
+                           'aufgeklärte Fälle': 'Aufklärung: Anzahl Fälle',
+                           'AQ \nin %': 'Aufklärung: in % (AQ)',
+                           'TV insges.': 'Tatverdächtige: insgesamt',
+                           'NDTV insges.': 'Nichtdeutsche Tatverdächtige: Anzahl',
+                           'NDTV in %': 'Nichtdeutsche Tatverdächtige: Anteil an TV insg. in %'}
+
+# Name of the federal rows, identical in the LKS01 tables since 2018 and used for the rows of the federal tables
+FEDERAL_TERRITORY = 'Bundesrepublik Deutschland'
+# Names of the federal rows in the LKS01 tables, 2013 - 2017 use the second one
+FEDERAL_LABELS = [FEDERAL_TERRITORY, 'Bund echte Zählung der Tatverdächtigen']
+# Values of the LKS01 tables replaced when reading, so that all years use the same name for the federal rows
+LKS01_REPLACE = {'Bundesland': {label: FEDERAL_TERRITORY for label in FEDERAL_LABELS if label != FEDERAL_TERRITORY}}
+
+# Columns identifying a row, they are parsed in addition to the renamed columns of a layout
+KEY_COLUMNS = ['Schlüssel', 'Straftat']
+# Counts of the T01 and LKS01 tables, parsed as integers
+CASE_COUNTS = ['Anzahl erfasste Fälle', 'erfasste Fälle: Anzahl Versuche', 'Aufklärung: Anzahl Fälle',
+               'Tatverdächtige: insgesamt', 'Nichtdeutsche Tatverdächtige: Anzahl']
+DETAIL_COUNTS = ['Tatortverteilung: bis unter 20.000 Einwohner', 'Tatortverteilung: 20.000 bis unter 100.000',
+                 'Tatortverteilung: 100.000 bis unter 500.000', 'Tatortverteilung: unbekannt', 'mit Schusswaffe: gedroht',
+                 'mit Schusswaffe: geschossen', 'Tatverdächtige: männlich', 'Tatverdächtige: weiblich']
+MONTHS = ['Jan.', 'Febr.', 'März', 'April', 'Mai', 'Juni', 'Juli', 'Aug.', 'Sept.', 'Okt.', 'Nov.', 'Dez.']
+
+
+def _usecols(rename:dict, extra:list=None) -> list:
+    """Returns the normalized names of the columns of a layout: the key columns, the renamed columns and extra columns
+    """
+    return list(dict.fromkeys(KEY_COLUMNS + list(rename.values()) + (extra or [])))
+
+
+def _dtypes(counts:list) -> dict:
+    """Returns the column types of a layout: keys as str and the given counts as integers
+    """
+    return {'Schlüssel': str, **{col: 'int64' for col in counts}}
+
+
+class TableSchema(object):
+    """
+        This is a class describing the layout of one PKS table for a range of years
+    """
+    def __init__(self, table:str, years:range, file_patterns:list, skiprows:int, thousands:str=',', decimal:str='.',
+                 usecols:list=None, names:list=None, dtype:dict=None, rename:dict=None, drop_rows:int=0,
+                 numbered_header:bool=False, replace:dict=None):
+        """Creates the description of a table layout. All parameters are plain data, a new year with a known
+           layout is supported by extending the years of a schema, a new layout by adding a schema to SCHEMAS.
+
+        Params:
+            table (str): Table name (e.g. 'T08')
+            years (range): Years with this layout
+            file_patterns (list): Glob patterns of the file names in the yearly directory (e.g. '*BU-T08-Tatzeit.*')
+            skiprows (int): Number of rows before the header row
+            thousands (str): Thousands separator (default: ',')
+            decimal (str): Decimal separator (default: '.')
+            usecols (list): Normalized names of the columns to parse, other columns are not converted (default: None, all columns)
+            names (list): Column names if the header is not used (default: None)
+            dtype (dict): Column types passed to pd.read_excel, keyed by the normalized names (default: None)
+            rename (dict): Map from the column names in the file to the normalized names (default: None)
+            drop_rows (int): Number of rows after the header that are skipped (default: 0)
+            numbered_header (bool): Whether the header contains column numbers that are converted to integers before renaming (default: False)
+            replace (dict): Map from the normalized column names to maps of cell values to their normalized values (default: None)
+        """
+        self.table = table
+        self.years = years
+        self.file_patterns = file_patterns
+        self.skiprows = skiprows
+        self.thousands = thousands
+        self.decimal = decimal
+        self.usecols = usecols
+        self.names = names
+        self.dtype = dtype
+        self.rename = rename if rename is not None else dict()
+        self.drop_rows = drop_rows
+        self.numbered_header = numbered_header
+        self.replace = replace if replace is not None else dict()
+
+    def matches(self, file:str) -> bool:
+        """Returns whether the file name matches one of the file patterns of the schema
+        """
+        return any(fnmatch.fnmatchcase(file, pattern) for pattern in self.file_patterns)
+
+
+SCHEMAS = [
+    # the T20 tables of 2012 - 2014 contain rows with percentages ('M %'), so their counts are not integers
+    TableSchema('T20', range(2012, 2015), ['*BU-T20-Tatverdaechtige.*'], skiprows=8,
+                usecols=_usecols(T20_COLUMNS), names=list(range(1, 25)), rename=T20_COLUMNS, dtype=_dtypes([])),
+    TableSchema('T20', range(2015, 2023), ['*BU-T20-Tatverdaechtige.*'], skiprows=8,
+                usecols=_usecols(T20_COLUMNS), names=list(range(1, 25)), rename=T20_COLUMNS,
+                dtype=_dtypes([col for col in T20_COLUMNS.values() if col not in ['Schlüssel', 'Straftat', 'Sex']])),
+    TableSchema('T08', range(2012, 2015), ['*BU-T08-Tatzeit.*'], skiprows=6, rename=T08_COLUMNS, numbered_header=True,
+                usecols=_usecols(T08_COLUMNS), dtype=_dtypes(['Anzahl erfasste Fälle', 'Tatzeit unbekannt'] + MONTHS)),
+    TableSchema('T08', range(2015, 2016), ['*BU-T08-Tatzeit.*'], skiprows=5, rename=T08_COLUMNS, numbered_header=True,
+                usecols=_usecols(T08_COLUMNS), dtype=_dtypes(['Anzahl erfasste Fälle', 'Tatzeit unbekannt'] + MONTHS)),
+    # the cases of 2016 and 2021 contain malformed values (e.g. 2.026, '4.553.024'), unknown months are missing for some
+    # keys in 2017, these columns keep the types of the file
+    TableSchema('T08', range(2016, 2023), ['*BU-T08-Tatzeit.*'], skiprows=6, rename=T08_COLUMNS, numbered_header=True,
+                usecols=_usecols(T08_COLUMNS), dtype=_dtypes(MONTHS)),
+    TableSchema('T01', range(2012, 2016), ['*tb01_FaelleGrundtabelle_excel*'], skiprows=3,
+                rename=T01_COLUMNS_2012_2015, drop_rows=4, usecols=_usecols(T01_COLUMNS_2012_2015),
+                dtype=_dtypes(CASE_COUNTS + DETAIL_COUNTS + ['Tatortveteilung: 500.000 und mehr'])),
+    TableSchema('T01', range(2016, 2023), ['*STD-F-01*', '*BU-F-01*', '*BU-T01-Faelle.*'], skiprows=3,
+                rename=T01_COLUMNS_2016_2022, drop_rows=4, usecols=_usecols(T01_COLUMNS_2016_2022, ['%-Anteil an allen Fällen']),
+                dtype=_dtypes(CASE_COUNTS + DETAIL_COUNTS + ['Tatortveteilung: 500.000 und mehr'])),
+    TableSchema('LKS01', range(2013, 2014), ['*Laender*'], skiprows=8, thousands='.', decimal=',',
+                rename=LKS01_COLUMNS_2013_2014, usecols=_usecols(LKS01_COLUMNS_2013_2014, ['Bundesland', 'HZ nach Zensus']),
+                dtype=_dtypes(CASE_COUNTS), replace=LKS01_REPLACE),
+    TableSchema('LKS01', range(2014, 2015), ['*Laender*'], skiprows=7, thousands='.', decimal=',',
+                rename=LKS01_COLUMNS_2013_2014, usecols=_usecols(LKS01_COLUMNS_2013_2014, ['Bundesland', 'HZ nach Zensus']),
+                dtype=_dtypes(CASE_COUNTS), replace=LKS01_REPLACE),
+    TableSchema('LKS01', range(2015, 2019), ['*Laender*'], skiprows=4, thousands='.', decimal=',',
+                rename=LKS01_COLUMNS_2015_2018, drop_rows=2,
+                usecols=_usecols(LKS01_COLUMNS_2015_2018, ['Bundesland', 'HZ nach Zensus']), dtype=_dtypes(CASE_COUNTS),
+                replace=LKS01_REPLACE),
+    TableSchema('LKS01', range(2019, 2023), ['*Laender*', '*LA-T01*'], skiprows=3, thousands='.', decimal=',',
+                rename=LKS01_COLUMNS_2019_2022, drop_rows=4,
+                usecols=_usecols(LKS01_COLUMNS_2019_2022, ['Bundesland', '%-Anteil an allen Fällen']),
+                dtype=_dtypes(CASE_COUNTS + DETAIL_COUNTS + ['Tatortverteilung: 500.000 und mehr']), replace=LKS01_REPLACE),
+]
+
+
+def get_schema(table:str, year:int) -> TableSchema:
+    """Returns the layout of a table in the given year
+
+    Args:
+        table (str): Table name (e.g. 'T08')
+        year (int): Year of the table
+
+    Returns:
+        schema (TableSchema): Layout of the table or None if the table has no layout for this year.
+                              Years after the newest registered layout use that layout (new releases usually keep it).
+    """
+    newest = None
+    for schema in SCHEMAS:
+        if schema.table == table and year in schema.years:
+            return schema
+        if schema.table == table and (newest is None or schema.years[-1] > newest.years[-1]):
+            newest = schema
+    if newest is not None and year > newest.years[-1]:
+        return newest
+    return None
+
+
+def get_years(table:str) -> list:
+    """Returns all years for which a layout of the table is registered
+
+    Args:
+        table (str): Table name (e.g. 'T08')
+
+    Returns:
+        years (list): Sorted list of years
+    """
+    return sorted(year for schema in SCHEMAS if schema.table == table for year in schema.years)
@@ -0,0 +1,69 @@
+"""Loading and processing of the PKS tables.
+
+Submodules and their public names are imported lazily on first access (PEP 562), so e.g. `import src` or
+`from src import LKS01` only loads pandas/numpy. geopandas/shapely are loaded by the spatial modules
+(GeoFunctions, or add_geomery when it is called) and matplotlib only when a plot is created.
+"""
+import importlib
+
+_SUBMODULES = ['Correlation', 'CsvStream', 'DataCache', 'DataCube', 'DataFunctions', 'DataLoaders', 'DataPanel',
+               'GeoFunctions', 'Instrumentation', 'KeyHierarchy', 'OffenderTensor', 'PlotFunctions', 'PlzLookup',
+               'Rates', 'Reconciliation', 'Schemas']
+
+# public name -> submodule defining it
+_ATTRIBUTES = {
+    'T01DataLoader': 'DataLoaders',
+    'T08DataLoader': 'DataLoaders',
+    'T20DataLoader': 'DataLoaders',
+    'LKS01': 'DataLoaders',
+    'read_table': 'DataLoaders',
+    'compact_table': 'DataLoaders',
+    'set_excel_backend': 'DataLoaders',
+    'configure_frame_cache': 'DataCache',
+    'get_schema': 'Schemas',
+    'build_panel': 'DataPanel',
+    'update_panel': 'DataPanel',
+    'get_panel_slice': 'DataPanel',
+    'compute_derived': 'DataPanel',
+    'DataCube': 'DataCube',
+    'export_cube': 'DataCube',
+    'update_cube': 'DataCube',
+    'KeyHierarchy': 'KeyHierarchy',
+    'migrate_keys': 'KeyHierarchy',
+    'get_months': 'DataFunctions',
+    'transform_df_to_list': 'DataFunctions',
+    'transform_monthly_data_to_list': 'DataFunctions',
+    'get_monthly_cases_by_keys': 'DataFunctions',
+    'get_yearly_cases_by_keys': 'DataFunctions',
+    'add_geomery': 'DataFunctions',
+    'read_pks_csv': 'CsvStream',
+    'aggregate_pks_csv': 'CsvStream',
+    'PlzLookup': 'PlzLookup',
+    'OffenderTensor': 'OffenderTensor',
+    'reconcile': 'Reconciliation',
+    'load_population': 'Rates',
+    'compute_rates': 'Rates',
+    'key_time_matrix': 'Correlation',
+    'correlation_matrix': 'Correlation',
+    'top_correlated_pairs': 'Correlation',
+    'load_region_geometry': 'GeoFunctions',
+    'RegionIndex': 'GeoFunctions',
+    'create_temporal_plots': 'PlotFunctions',
+    'export_temporal_plots': 'PlotFunctions',
+}
+
+__all__ = _SUBMODULES + list(_ATTRIBUTES.keys())
+
+
+def __getattr__(name:str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    if name in _ATTRIBUTES:
+        value = getattr(importlib.import_module(f'.{_ATTRIBUTES[name]}', __name__), name)
+        globals()[name] = value # later accesses do not go through __getattr__
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,29 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pandas as pd
+import pytest
+from src.DataLoaders import T01DataLoader, T08DataLoader, T20DataLoader, LKS01, read_table
+from src import Instrumentation
+
+ROOT_DIR = os.path.join(REPO_ROOT, 'dat', 'PKS')
+TABLES = [(cls, year) for cls in [T01DataLoader, T08DataLoader, T20DataLoader, LKS01]
+          for year in cls(ROOT_DIR).available_years()]
+
+
+@pytest.mark.parametrize('cls, year', TABLES, ids=[f'{cls.table}-{year}' for cls, year in TABLES])
+def test_excel_backends_identical(cls, year):
+    pytest.importorskip('python_calamine')
+    fpath, schema = cls(ROOT_DIR).get_file(year)
+    Instrumentation.enable()
+    try:
+        calamine = read_table(fpath, schema, backend='calamine')
+        fallbacks = Instrumentation.get_counters().get('read_table.excel_fallback', 0)
+    finally:
+        Instrumentation.disable()
+    default = read_table(fpath, schema, backend='default')
+    assert fallbacks == 0
+    pd.testing.assert_frame_equal(calamine, default)
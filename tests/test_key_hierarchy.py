@@ -0,0 +1,34 @@
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pandas as pd
+from src.DataLoaders import T01DataLoader, T08DataLoader
+from src.KeyHierarchy import get_key_for_year, migrate_keys
+
+ROOT_DIR = os.path.join(REPO_ROOT, 'dat', 'PKS')
+
+
+def _cases(df:pd.DataFrame, key:str) -> list:
+    return pd.to_numeric(df.loc[df['Schlüssel'].astype(str) == key, 'Anzahl erfasste Fälle']).tolist()
+
+
+def test_migrate_keys_2015():
+    # T01 2015 only has the old key, T08 2015 already has the new key next to the old ones
+    t01 = migrate_keys(T01DataLoader(ROOT_DIR, use_cache=False)[2015], 2015, 'T01')
+    assert _cases(t01, '517500') == []
+    assert _cases(t01, '897100') == [23562]
+
+    t08 = migrate_keys(T08DataLoader(ROOT_DIR, use_cache=False)[2015], 2015, 'T08')
+    assert _cases(t08, '897100') == [16413]
+    assert sorted(_cases(t08, '517500')) == [3488, 15019]
+
+
+def test_get_key_for_year():
+    assert get_key_for_year('897100', 2015, 'T01') == '517500'
+    assert get_key_for_year('897100', 2015, 'T08') == '897100'
+    assert get_key_for_year('897100', 2014, 'T08') == '517500'
+    assert get_key_for_year('897100', 2016, 'T01') == '897100'
+    assert get_key_for_year('517500', 2020, 'T01') == '517500'